@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# Run slow data sources (headlines, Spotify) on a worker thread so render loops never wait on the network.
+import threading
+import time
+
+
+class BackgroundFetcher():
+    def __init__(self, fetch, interval, initial=None, valid=None, name=None, clock=time.monotonic):
+        """
+        Call fetch() every interval seconds on a daemon thread and publish the result.
+
+        The render loop reads latest / version, which are replaced together in a single
+        assignment, so it never sees a half-updated value and never blocks. If fetch
+        raises or returns something valid() rejects, the last good value is kept.
+
+        :param fetch: Callable returning the new value.
+        :param interval: Seconds between the start of one fetch and the next.
+        :param initial: Value published until the first successful fetch.
+        :param valid: Optional check, values it returns False for are discarded.
+        :param name: Thread name, used in error messages.
+        """
+        self.fetch = fetch
+        self.interval = interval
+        self.valid = valid
+        self.name = name or getattr(fetch, '__name__', 'fetcher')
+        self.clock = clock
+        self.published = (initial, 0, None)   # (value, version, time of fetch)
+        self.failures = 0
+        self.lastError = None
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def latest(self):
+        """Most recent good value"""
+        return self.published[0]
+
+    @property
+    def version(self):
+        """Increases every time a new value is published"""
+        return self.published[1]
+
+    def age(self):
+        """Seconds since the latest value was fetched, None if nothing was fetched yet"""
+        fetched = self.published[2]
+        return None if fetched is None else self.clock() - fetched
+
+    def fetchOnce(self):
+        """Run one fetch on the calling thread, returns True if a new value was published"""
+        try:
+            value = self.fetch()
+        except Exception as e:
+            self.failures += 1
+            self.lastError = e
+            print(f"{self.name}: fetch failed, keeping last value: {e}")
+            return False
+        if self.valid is not None and not self.valid(value):
+            self.failures += 1
+            self.lastError = ValueError(f"rejected {value!r}")
+            return False
+        self.published = (value, self.published[1] + 1, self.clock())
+        return True
+
+    def start(self):
+        """Fetch immediately and then every interval until stop()"""
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def loop(self):
+        while not self.stopped.is_set():
+            started = self.clock()
+            self.fetchOnce()
+            self.wake.wait(max(0.0, self.interval - (self.clock() - started)))
+            self.wake.clear()
+
+    def refreshNow(self):
+        """Ask the worker to fetch again without waiting for the interval"""
+        self.wake.set()
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# Headless benchmarks for the simulation, render and display hot paths.
+#
+#   python benchmark.py                          run everything, write benchmark.json
+#   python benchmark.py --quick                  small grids only
+#   python benchmark.py --baseline base.json     compare against a stored run
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+
+from forestFire import ForestFire, DEFAULT_PROBABILITIES
+from deltaDisplay import DeltaDisplay
+
+
+SIZES = [(128, 32), (512, 512), (1024, 1024), (4096, 4096)]
+QUICK_SIZES = [(128, 32), (512, 512)]
+DENSITIES = [0.00025, 0.3]
+SEED = 1000
+
+
+class NullCanvas():
+    """Canvas that accepts the calls DeltaDisplay makes and does nothing, so only our side is timed"""
+    def SetPixel(self, x, y, r, g, b):
+        pass
+
+    def SetImage(self, image, x=0, y=0):
+        pass
+
+
+class NullMatrix():
+    def CreateFrameCanvas(self):
+        return NullCanvas()
+
+    def SwapOnVSync(self, canvas):
+        return canvas
+
+
+def timeCalls(fn, min_calls=5, min_seconds=1.0, max_calls=2000):
+    """Call fn repeatedly and return the per-call times in ms"""
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_calls and (len(times) < min_calls or time.perf_counter() - start < min_seconds):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return np.array(times)
+
+
+def summary(name, times, cells=None, **extra):
+    """Latency percentiles for a stage, plus throughput if it processes a grid"""
+    result = {
+        'name'    : name,
+        'calls'   : int(times.size),
+        'mean_ms' : float(times.mean()),
+        'p50_ms'  : float(np.percentile(times, 50)),
+        'p90_ms'  : float(np.percentile(times, 90)),
+        'p99_ms'  : float(np.percentile(times, 99)),
+        'per_s'   : float(1000 / times.mean()),
+    }
+    if cells is not None:
+        result['cells_per_s'] = float(cells * 1000 / times.mean())
+    result.update(extra)
+    return result
+
+
+def panelMatrix(panel, width, height):
+    """
+    Matrix the display stages draw on: 'null' times only our side, 'emulated' draws on
+    an emulatedMatrix of the grid's size and reports its modelled panel cost too.
+    """
+    if panel == 'null':
+        return NullMatrix()
+    from emulatedMatrix import RGBMatrix, RGBMatrixOptions
+    options = RGBMatrixOptions()
+    options.rows, options.cols = height, width
+    return RGBMatrix(options=options)
+
+
+def panelStats(matrix):
+    """Modelled cost per frame of an emulated matrix, nothing for the null one"""
+    if not hasattr(matrix, 'stats'):
+        return {}
+    stats = matrix.stats()
+    return {'panel_draw_ms': stats['drawMsPerFrame'], 'panel_calls': stats['callsPerFrame'],
+            'panel_refresh_hz': stats['refreshHz']}
+
+
+def benchForest(width, height, density, engine, min_seconds, panel='null'):
+    """Generations/s and per-stage latency for one grid size, density and engine"""
+    forest = ForestFire(timestep=0, probs=DEFAULT_PROBABILITIES, density=density, seed=SEED,
+                        engine=engine, width=width, height=height)
+    forest.cycle()      # warm up buffers
+    name = f"forest/{engine}/{width}x{height}/d{density}"
+    cells = width * height
+    results = [summary(name + "/cycle", timeCalls(forest.cycle, min_seconds=min_seconds), cells)]
+
+    rates = DEFAULT_PROBABILITIES['BasicTree']
+    results.append(summary(name + "/burn", timeCalls(lambda: forest.burn(1,
+        rates['FireSpreadRate'], rates['FireDeathRate'], rates['FireExtinguishRate']), min_seconds=min_seconds / 4), cells))
+    results.append(summary(name + "/grow", timeCalls(lambda: forest.grow(1,
+        rates['GrowthSpreadRate'], rates['NaturalDeathRate'], rates['LightningRate']), min_seconds=min_seconds / 4), cells))
+    results.append(summary(name + "/render", timeCalls(forest.forestToImage, min_seconds=min_seconds / 4), cells))
+
+    matrix = panelMatrix(panel, width, height)
+    display = DeltaDisplay(matrix, forest.palette)
+    def cycleAndShow():
+        forest.cycle()
+        display.show(forest.forest)
+    display.show(forest.forest)
+    start = display.pixelsSent
+    showTimes = timeCalls(cycleAndShow, min_seconds=min_seconds / 4)
+    results.append(summary(name + "/cycle+display", showTimes, cells,
+                           pixels_per_frame=float((display.pixelsSent - start) / showTimes.size), **panelStats(matrix)))
+    return results
+
+
+def benchBounce(min_seconds, sprites=(1, 32)):
+    """Frame cost of the bouncing squares"""
+    try:
+        from bouncingSquare import runBounce
+    except ImportError as e:
+        return [{'name': 'bounce/frame', 'skipped': str(e)}]
+    from spriteEngine import SpriteLayer
+    results = []
+    for count in sprites:
+        bounce = runBounce(run=False, count=count)
+        bounce.reset(128, 32)
+        layer = SpriteLayer(128, 32)
+        for sprite in bounce.sprites:
+            layer.add(sprite)
+        canvas = NullCanvas()
+        def frame():
+            bounce.move()
+            layer.present(canvas)
+        frame(), frame()    # the first frames are drawn in full
+        results.append(summary(f'bounce/frame/{count}', timeCalls(frame, min_seconds=min_seconds / len(sprites)), sprites=count))
+    return results
+
+
+def benchText(min_seconds):
+    """Frame cost of a headline-sized marquee with the pre-rendered text layer"""
+    from textLayer import BdfFont, TextLine, TextCompositor
+    try:
+        font = BdfFont("fonts/8x13.bdf")
+    except OSError as e:
+        return [{'name': 'text/frame', 'skipped': str(e)}]
+    text = ". ".join(["A headline of about average length for the top stories feed"] * 25)
+    line = TextLine(font, (255, 255, 0), 9, text)
+    compositor = TextCompositor(128, 32)
+    canvas = NullCanvas()
+    position = [0]
+    def frame():
+        position[0] = (position[0] - 1) % -line.width
+        compositor.clear()
+        line.draw(compositor.frame, position[0])
+        compositor.present(canvas)
+    return [summary('text/rasterize', timeCalls(lambda: font.render(text), min_seconds=min_seconds / 4), chars=len(text)),
+            summary('text/frame', timeCalls(frame, min_seconds=min_seconds), chars=len(text))]
+
+
+def compare(results, baseline, threshold):
+    """Print each stage against the baseline, return the names that got slower than threshold"""
+    base = {r['name']: r for r in baseline['results'] if 'mean_ms' in r}
+    regressions = []
+    for r in results:
+        if 'mean_ms' not in r or r['name'] not in base:
+            continue
+        ratio = r['mean_ms'] / base[r['name']]['mean_ms']
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  <-- slower"
+            regressions.append(r['name'])
+        print(f"{r['name']:<55} {base[r['name']]['mean_ms']:10.3f} -> {r['mean_ms']:10.3f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ForestFire, text and bounce hot paths")
+    parser.add_argument('--quick', action='store_true', help="only the small grid sizes")
+    parser.add_argument('--engines', default='numpy,frontier', help="comma separated ForestFire engines")
+    parser.add_argument('--seconds', type=float, default=1.0, help="minimum time per stage")
+    parser.add_argument('--output', default='benchmark.json', help="where to write the results")
+    parser.add_argument('--baseline', help="results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="slowdown that counts as a regression")
+    parser.add_argument('--panel', choices=('null', 'emulated'), default='null',
+                        help="draw the display stages on a do-nothing matrix or on the emulated panel")
+    args = parser.parse_args(argv)
+
+    results = []
+    for width, height in QUICK_SIZES if args.quick else SIZES:
+        for density in DENSITIES:
+            for engine in args.engines.split(','):
+                results += benchForest(width, height, density, engine, args.seconds, args.panel)
+                print(f"{results[-5]['name']:<55} {results[-5]['per_s']:10.1f} generations/s", flush=True)
+    results += benchBounce(args.seconds)
+    results += benchText(args.seconds)
+
+    report = {
+        'meta': {
+            'time'     : time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python'   : sys.version.split()[0],
+            'numpy'    : np.__version__,
+            'platform' : platform.platform(),
+            'machine'  : platform.machine(),
+            'seed'     : SEED,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stages slower than the baseline by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+# Main function
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,76 +1,89 @@
 
 from PIL import Image
 from PIL import ImageDraw
-import time
 import random as rand
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
 
-from samplebase import SampleBase
-
-# Configuration for the matrix
-options = RGBMatrixOptions()
-options.rows = 32
-options.cols = 64
-options.chain_length = 2
-options.parallel = 1
-options.hardware_mapping = 'adafruit-hat'
-options.led_rgb_sequence = 'RBG'    
-options.pixel_mapper_config = 'Rotate:180'
-
-matrix = RGBMatrix(options = options)
+try:
+    from samplebase import SampleBase
+except ModuleNotFoundError:
+    from emulatedMatrix import SampleBase
+from frameScheduler import FrameScheduler
+from profiling import profiler
+from matrixConfig import getMatrix
+from spriteEngine import SpriteAtlas, Sprite, SpriteLayer
 
 
 class runBounce(SampleBase):
-    def __init__(self,SquareDim = 10,tick=0.05):
+    def __init__(self,SquareDim = 10,tick=0.05,run=True,count=1):
+        """
+        :param SquareDim: Side of the square in pixels.
+        :param tick: Seconds per move.
+        :param run: Start the bounce loop on the panel, False to drive it with move() and draw() instead.
+        :param count: Number of squares bouncing at the same time.
+        """
         self.dim = SquareDim
         self.tick = tick
+        self.count = count
         self.rainbow = self.generate_rainbow()
         self.color = self.rainbow[0]
-        self.loopBounce()
+        # The square only changes colour, so every colour is drawn once up front
+        self.atlas = SpriteAtlas([self.createSquare(color) for color in self.rainbow])
+        self.sprites = []
+        if run:
+            self.loopBounce()
 
-    def createSquare(self):
+    def createSquare(self, color=None):
         # RGB example w/graphics prims.
         # Note, only "RGB" mode is supported currently.
         self.img = Image.new("RGB", (self.dim+1, self.dim+1))
         draw = ImageDraw.Draw(self.img)
         # Draw some shapes into image
-        draw.rectangle((0, 0, self.dim, self.dim), fill=(0, 0, 0), outline=self.color)
+        draw.rectangle((0, 0, self.dim, self.dim), fill=(0, 0, 0), outline=color or self.color)
         draw.line((0, 0, self.dim, self.dim), fill='pink')
         draw.line((0, self.dim, self.dim, 0), fill='yellow')
-
-    def drawOnPanel(self,loc):
-        matrix.Clear()
-        matrix.SetImage(self.img, loc['x'],loc['y'])
-        time.sleep(0.1)
+        return self.img
+
+    def reset(self, width, height):
+        """Start every square from a random spot inside a width x height area"""
+        self.width, self.height = width, height
+        heightLim = height-self.dim-1
+        widLim = width-self.dim-1
+        self.sprites = [Sprite(self.atlas, rand.randint(1,widLim), rand.randint(1,heightLim)) for _ in range(self.count)]
+        # the first square starts at red going down-right, the others anywhere in the rainbow
+        for sprite in self.sprites[1:]:
+            sprite.dx, sprite.dy = rand.choice((-1, 1)), rand.choice((-1, 1))
+            sprite.frame = rand.randrange(len(self.atlas))
+
+    def move(self):
+        """Advance every square one tick, bouncing off the edges and stepping through the rainbow"""
+        for sprite in self.sprites:
+            sprite.bounce(self.width, self.height)
+        self.color = self.rainbow[self.sprites[0].frame]
+
+    def draw(self, canvas):
+        """Draw the squares onto canvas at their current spots"""
+        for sprite in self.sprites:
+            sprite.draw(canvas)
 
     def loopBounce(self):
-
-        heightLim = matrix.height-self.dim-1
-        widLim = matrix.width-self.dim-1
-        x_inc = 1
-        y_inc = 1
-
-        loc = {'x':rand.randint(1,widLim),'y':rand.randint(1,heightLim)}
-        sz = 0
+        matrix = getMatrix()
+        canvas = matrix.CreateFrameCanvas()
+        self.reset(canvas.width, canvas.height)
+        layer = SpriteLayer(canvas.width, canvas.height, buffers=2)
+        for sprite in self.sprites:
+            layer.add(sprite)
 
         print("Runnning Bounce Loop. Press ctrl+C to continue...")
 
-        while True:
-            self.createSquare()
-            self.drawOnPanel(loc)
-            if loc['x'] >= widLim or loc['x'] < 1:
-                x_inc = x_inc*-1
-            if loc['y'] >= heightLim or loc['y'] < 1:
-                y_inc = y_inc*-1
-            if sz == 305:
-                sz = 0
-            else:
-                sz += 1
-
-            loc['x'] += x_inc
-            loc['y'] += y_inc
+        def render():
+            nonlocal canvas
+            # only the spots the squares left and moved to are redrawn
+            with profiler.stage('bounce.present'):
+                layer.present(canvas)
+                canvas = matrix.SwapOnVSync(canvas)
 
-            self.color = self.rainbow[sz]
+        # move once per tick, skip drawing if the panel can't keep up
+        FrameScheduler(sim_rate=1 / self.tick).run(self.move, render)
 
     def generate_rainbow(self):
         stp=5
@@ -115,4 +128,5 @@ class runBounce(SampleBase):
         
         return colors
 if __name__ == "__main__":
+    profiler.configureFromEnvironment()
     runBounce()
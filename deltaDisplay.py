@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# Push state grids to the panel, only redrawing the pixels that changed.
+from PIL import Image
+import numpy as np
+import time
+
+from profiling import timed
+
+
+class DeltaDisplay():
+    def __init__(self, matrix, palette, full_threshold=0.05):
+        """
+        Present state grids through an offscreen canvas and SwapOnVSync.
+
+        Each frame is diffed against what was last drawn on the canvas being
+        drawn into, and only the changed cells are sent with SetPixel. Above
+        full_threshold (fraction of cells changed) a single SetImage is cheaper.
+
+        :param matrix: RGBMatrix (or anything with CreateFrameCanvas and SwapOnVSync).
+        :param palette: uint8 (states, 3) table of RGB rows, e.g. forestFire.PALETTES.
+        :param full_threshold: Fraction of changed cells above which the whole frame is blitted.
+        """
+        self.matrix = matrix
+        self.canvas = matrix.CreateFrameCanvas()
+        self.full_threshold = full_threshold
+        self.setPalette(palette)
+
+        # The two canvases alternate on every swap, so keep what was last drawn
+        # on each of them; None forces a full blit
+        self.shown = [None, None]
+        self.current = 0
+        self.image = None
+        self.imageBuffer = None
+
+        self.frames = 0
+        self.fullFrames = 0
+        self.pixelsSent = 0
+        self.stageSeconds = (0.0, 0.0, 0.0)   # lookup, draw and swap time of the last frame
+
+    def setPalette(self, palette):
+        """Change the colours, the next frames are drawn in full"""
+        self.palette = np.ascontiguousarray(palette, dtype=np.uint8)
+        self.shown = [None, None]
+
+    @timed('display.show')
+    def show(self, states):
+        """
+        Draw a 2-D state grid on the offscreen canvas and swap it onto the panel.
+        Afterwards stageSeconds holds how long the frame spent in the diff and
+        palette lookup, in the canvas calls and in SwapOnVSync.
+        """
+        start = time.perf_counter()
+        last = self.shown[self.current]
+        if last is None or last.shape != states.shape:
+            self.shown[self.current] = states.copy()
+            changed = None
+        else:
+            changed = np.flatnonzero(states != last)
+            np.copyto(last, states)
+
+        if changed is None or changed.size > self.full_threshold * states.size:
+            self.lookup(states)
+            drawn = time.perf_counter()
+            self.blit()
+        else:
+            width = states.shape[1]
+            colors = self.palette[states.flat[changed]].tolist()
+            drawn = time.perf_counter()
+            for cell, (r, g, b) in zip(changed.tolist(), colors):
+                y, x = divmod(cell, width)
+                self.canvas.SetPixel(x, y, r, g, b)
+            self.pixelsSent += changed.size
+
+        swapped = time.perf_counter()
+        self.frames += 1
+        self.canvas = self.matrix.SwapOnVSync(self.canvas)
+        self.current ^= 1
+        self.stageSeconds = (drawn - start, swapped - drawn, time.perf_counter() - swapped)
+
+    def lookup(self, states):
+        """Colour every cell through the palette into imageBuffer"""
+        height, width = states.shape
+        if self.imageBuffer is None or self.imageBuffer.shape[:2] != states.shape:
+            self.imageBuffer = np.empty((height, width, 3), dtype=np.uint8)
+            self.image = Image.new('RGB', (width, height))
+        np.take(self.palette, states, axis=0, out=self.imageBuffer, mode='clip')
+
+    def blit(self):
+        """Draw imageBuffer with one SetImage"""
+        self.image.frombytes(self.imageBuffer.data)
+        self.canvas.SetImage(self.image, 0, 0)
+        self.fullFrames += 1
+        self.pixelsSent += self.imageBuffer.shape[0] * self.imageBuffer.shape[1]
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# One long-lived process that owns the panel and shows the apps as scenes.
+#
+# A scene advances with update(dt) and draws with render(canvas). The active
+# scenes are layers, drawn bottom first into one frame (e.g. the clock over the
+# forest), which is pushed to the panel with a single SetImage and SwapOnVSync.
+# A playlist rotates through sets of layers; switching just changes which
+# scenes are updated and drawn, the matrix and the scenes stay alive.
+from PIL import Image
+import numpy as np
+import time
+
+from emulatedMatrix import pasteImage
+from matrixConfig import getMatrix
+from frameScheduler import FrameScheduler
+from profiling import profiler
+
+
+class LayerCanvas():
+    def __init__(self, width, height):
+        """
+        RGB frame the layers draw into. It takes the FrameCanvas calls the apps
+        already make (Clear, SetPixel, SetImage) and exposes the pixels as frame
+        for the numpy based scenes.
+
+        :param width: Canvas width in pixels.
+        :param height: Canvas height in pixels.
+        """
+        self.width = width
+        self.height = height
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.image = Image.new('RGB', (width, height))
+
+    def Clear(self):
+        self.frame.fill(0)
+
+    def SetPixel(self, x, y, r, g, b):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.frame[y, x] = (r, g, b)
+
+    def SetImage(self, image, x=0, y=0):
+        """Paste a PIL image with its top left corner at x, y, clipped to the canvas"""
+        pasteImage(self.frame, image, x, y)
+
+    def present(self, canvas):
+        """Copy the frame onto a panel canvas"""
+        self.image.frombytes(self.frame.data)
+        canvas.SetImage(self.image, 0, 0)
+
+
+class Scene():
+    """
+    Base for everything the runtime shows. enter() is called each time the scene
+    becomes visible, exit() when it is hidden; a hidden scene is not updated.
+    """
+    name = 'scene'
+
+    def enter(self, runtime):
+        pass
+
+    def exit(self):
+        pass
+
+    def update(self, dt):
+        """Advance by dt seconds"""
+        pass
+
+    def render(self, canvas):
+        """Draw onto a LayerCanvas, on top of the layers below"""
+        pass
+
+    def close(self):
+        """Release threads and resources when the runtime shuts down"""
+        pass
+
+
+class FixedRate():
+    """Turns the dt passed to update() into a whole number of fixed-length steps"""
+    def __init__(self, interval, max_steps=4):
+        self.interval = interval
+        self.max_steps = max_steps
+        self.pending = 0.0
+
+    def steps(self, dt):
+        if self.interval <= 0:
+            return 1
+        self.pending += dt
+        steps = min(int(self.pending / self.interval), self.max_steps)
+        self.pending = min(self.pending - steps * self.interval, self.interval)  # drop what can't be caught up
+        return steps
+
+
+class ForestScene(Scene):
+    name = 'forest'
+
+    def __init__(self, forest):
+        """
+        :param forest: ForestFire, cycled every forest.timestep seconds while visible.
+        """
+        self.forest = forest
+        self.rate = FixedRate(forest.timestep)
+
+    def update(self, dt):
+        for _ in range(self.rate.steps(dt)):
+            self.forest.cycle()
+
+    def render(self, canvas):
+        states = self.forest.forest[:canvas.height, :canvas.width]
+        np.take(self.forest.palette, states, axis=0, out=canvas.frame[:states.shape[0], :states.shape[1]], mode='clip')
+
+
+class ClockScene(Scene):
+    name = 'clock'
+
+    def __init__(self, font_path='fonts/6x9.bdf', color=(180,255,70), baseline=32, x=0, format="%I:%M:%S"):
+        """Time of day, drawn without a background so it can sit over another scene"""
+        from textLayer import BdfFont, ClockLine
+        self.line = ClockLine(BdfFont(font_path), color, baseline, format)
+        self.x = x
+
+    def render(self, canvas):
+        self.line.update()
+        self.line.draw(canvas.frame, self.x)
+
+
+class TextScene(Scene):
+    name = 'text'
+
+    def __init__(self, runText):
+        """
+        :param runText: textDriver.RunText, its news, clock and Spotify lines are
+            drawn without a background.
+        """
+        self.runText = runText
+        self.rate = FixedRate(runText.scroll_speed)
+        self.started = False
+
+    def enter(self, runtime):
+        if not self.started:
+            self.runText.setup(runtime.width)
+            self.started = True
+
+    def update(self, dt):
+        for _ in range(self.rate.steps(dt)):
+            self.runText.scroll()
+
+    def render(self, canvas):
+        self.runText.draw(canvas.frame)
+
+    def close(self):
+        if self.started:
+            self.runText.stop()
+
+
+class BounceScene(Scene):
+    name = 'bounce'
+
+    def __init__(self, bounce):
+        """
+        :param bounce: bouncingSquare.runBounce created with run=False.
+        """
+        self.bounce = bounce
+        self.rate = FixedRate(bounce.tick)
+        self.started = False
+
+    def enter(self, runtime):
+        if not self.started:
+            self.bounce.reset(runtime.width, runtime.height)
+            self.started = True
+
+    def update(self, dt):
+        for _ in range(self.rate.steps(dt)):
+            self.bounce.move()
+
+    def render(self, canvas):
+        self.bounce.draw(canvas)
+
+
+class Playlist():
+    def __init__(self, entries, loop=True):
+        """
+        :param entries: List of (seconds, layers), layers being a list of scenes
+            drawn bottom first. seconds None shows the entry until stopped.
+        :param loop: Start over after the last entry, otherwise stay on it.
+        """
+        if not entries:
+            raise ValueError("a playlist needs at least one entry")
+        self.entries = [(seconds, list(layers)) for seconds, layers in entries]
+        self.loop = loop
+        self.index = 0
+        self.elapsed = 0.0
+
+    @property
+    def layers(self):
+        return self.entries[self.index][1]
+
+    def advance(self, dt):
+        """Move the clock on by dt seconds, returns True when the entry changed"""
+        seconds = self.entries[self.index][0]
+        self.elapsed += dt
+        if seconds is None or self.elapsed < seconds:
+            return False
+        if self.index + 1 == len(self.entries) and not self.loop:
+            return False
+        self.index = (self.index + 1) % len(self.entries)
+        self.elapsed = 0.0
+        return True
+
+    def scenes(self):
+        """Every scene of the playlist, once"""
+        unique = []
+        for _, layers in self.entries:
+            unique += [scene for scene in layers if scene not in unique]
+        return unique
+
+
+class DisplayRuntime():
+    def __init__(self, matrix=None, fps=60):
+        """
+        Owns the matrix and its one offscreen canvas and shows a Playlist of scenes.
+
+        :param matrix: RGBMatrix to draw on, defaults to the shared matrixConfig.getMatrix().
+        :param fps: Updates and frames per second.
+        """
+        self.matrix = matrix or getMatrix()
+        self.canvas = self.matrix.CreateFrameCanvas()
+        self.width = self.canvas.width
+        self.height = self.canvas.height
+        self.layerCanvas = LayerCanvas(self.width, self.height)
+        self.fps = fps
+        self.active = []
+        self.switchTimes = []   # seconds each scene switch took
+
+    def show(self, layers):
+        """Make layers the visible scenes, calling exit() and enter() on the ones that change"""
+        start = time.perf_counter()
+        for scene in self.active:
+            if scene not in layers:
+                scene.exit()
+        for scene in layers:
+            if scene not in self.active:
+                scene.enter(self)
+        self.active = list(layers)
+        self.switchTimes.append(time.perf_counter() - start)
+
+    def step(self, dt):
+        for scene in self.active:
+            with profiler.stage(f'runtime.{scene.name}.update'):
+                scene.update(dt)
+
+    def render(self):
+        self.layerCanvas.Clear()
+        for scene in self.active:
+            with profiler.stage(f'runtime.{scene.name}.render'):
+                scene.render(self.layerCanvas)
+        self.layerCanvas.present(self.canvas)
+        with profiler.stage('runtime.swap'):
+            self.canvas = self.matrix.SwapOnVSync(self.canvas)
+
+    def run(self, playlist, frames=None):
+        """
+        Show the playlist until Ctrl+C or frames steps have run.
+
+        :param playlist: Playlist, or a list of scenes to show as layers forever.
+        """
+        if not isinstance(playlist, Playlist):
+            playlist = Playlist([(None, playlist)])
+        dt = 1 / self.fps
+
+        def step():
+            if playlist.advance(dt):
+                self.show(playlist.layers)
+            self.step(dt)
+
+        self.show(playlist.layers)
+        try:
+            FrameScheduler(sim_rate=self.fps).run(step, self.render, steps=frames)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for scene in self.active:
+                scene.exit()
+            self.active = []
+            for scene in playlist.scenes():
+                scene.close()
+
+
+# Main function
+if __name__ == "__main__":
+    from forestFire import ForestFire, DEFAULT_PROBABILITIES
+    from textDriver import RunText
+    from bouncingSquare import runBounce
+
+    profiler.configureFromEnvironment()
+    forest = ForestScene(ForestFire(timestep=0.05, density=0.00025, probs=DEFAULT_PROBABILITIES))
+    playlist = Playlist([
+        (120, [forest, ClockScene()]),
+        (60,  [TextScene(RunText(text="Loading headlines...", news_color=(255, 0, 0), scroll_speed=0.03))]),
+        (30,  [BounceScene(runBounce(run=False))]),
+    ])
+    DisplayRuntime(fps=60).run(playlist)
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+# Stand-in for the rgbmatrix module on machines without a panel.
+#
+# Implements the part of the RGBMatrix API the apps use on top of a NumPy
+# framebuffer, plus graphics.DrawText with BDF fonts and a SampleBase. Shown
+# frames can be captured to disk, and a timing model of the panel refresh and of
+# the drawing calls accounts for what the same frames would cost on the Pi:
+#
+#   PANEL_CAPTURE=/tmp/frames python forestFire.py     # a PNG per shown frame
+#   PANEL_CAPTURE=/tmp/run.rgb python forestFire.py    # raw RGB frames in one file
+#   PANEL_REALTIME=1 python textDriver.py              # SwapOnVSync waits like the panel does
+import argparse
+import json
+import os
+import sys
+import time
+from PIL import Image
+import numpy as np
+
+from textLayer import BdfFont
+
+
+class RGBMatrixOptions():
+    """Same fields and defaults as rgbmatrix.RGBMatrixOptions, the emulator reads the geometry and PWM ones"""
+    def __init__(self):
+        self.rows = 32
+        self.cols = 32
+        self.chain_length = 1
+        self.parallel = 1
+        self.pwm_bits = 11
+        self.pwm_lsb_nanoseconds = 130
+        self.brightness = 100
+        self.scan_mode = 0
+        self.multiplexing = 0
+        self.row_address_type = 0
+        self.hardware_mapping = 'regular'
+        self.led_rgb_sequence = 'RGB'
+        self.pixel_mapper_config = ''
+        self.panel_type = ''
+        self.gpio_slowdown = 1
+        self.limit_refresh_rate_hz = 0
+        self.show_refresh_rate = 0
+        self.disable_hardware_pulsing = False
+        self.drop_privileges = True
+
+
+class PanelTiming():
+    def __init__(self, rows=32, cols=32, chain_length=1, parallel=1, pwm_bits=11, pwm_lsb_nanoseconds=130,
+                 gpio_slowdown=1, clock_ns=20, call_ns=1000, pixel_ns=15, limit_refresh_rate_hz=0):
+        """
+        Rough model of what driving a HUB75 chain costs.
+
+        The panel is refreshed continuously: for each of rows / 2 multiplexed row
+        pairs every PWM bit plane is shifted out (one clock per column of the chain,
+        the parallel chains shift at the same time) and then lit for
+        pwm_lsb_nanoseconds * 2**bit, and the next plane is shifted while the
+        previous one is lit. SwapOnVSync returns at the end of a refresh.
+
+        Drawing calls cost CPU on the Pi: call_ns per SetPixel / SetImage / Clear
+        and pixel_ns per pixel written.
+
+        :param clock_ns: GPIO clock period at gpio_slowdown 0, each step of slowdown adds one.
+        """
+        self.scanRows = max(1, rows // 2)
+        shift = cols * chain_length * clock_ns * (gpio_slowdown + 1)
+        plane = sum(max(shift, pwm_lsb_nanoseconds * (1 << bit)) for bit in range(pwm_bits))
+        self.refreshSeconds = self.scanRows * plane / 1e9
+        if limit_refresh_rate_hz:
+            self.refreshSeconds = max(self.refreshSeconds, 1 / limit_refresh_rate_hz)
+        self.call_ns = call_ns
+        self.pixel_ns = pixel_ns
+
+    @classmethod
+    def fromOptions(cls, options, **kwargs):
+        return cls(options.rows, options.cols, options.chain_length, options.parallel, options.pwm_bits,
+                   options.pwm_lsb_nanoseconds, options.gpio_slowdown,
+                   limit_refresh_rate_hz=options.limit_refresh_rate_hz, **kwargs)
+
+    @property
+    def refreshHz(self):
+        return 1 / self.refreshSeconds
+
+    def drawSeconds(self, calls, pixels):
+        return (calls * self.call_ns + pixels * self.pixel_ns) / 1e9
+
+    def nextVSync(self, seconds, fraction=1):
+        """Time of the first refresh boundary (every fraction-th one) after seconds"""
+        period = self.refreshSeconds * max(1, fraction)
+        return (int(seconds / period) + 1) * period
+
+
+class FrameCapture():
+    def __init__(self, path, every=1):
+        """
+        Write shown frames to disk.
+
+        :param path: Directory for frame-000001.png files, or a file ending in .rgb
+            that raw frames are appended to (the shape goes to path + '.json').
+        :param every: Keep one frame in every.
+        """
+        self.path = path
+        self.every = every
+        self.raw = path.endswith('.rgb')
+        self.frames = 0
+        self.written = 0
+        self.file = None
+        if not self.raw:
+            os.makedirs(path, exist_ok=True)
+
+    def write(self, pixels):
+        self.frames += 1
+        if (self.frames - 1) % self.every:
+            return
+        self.written += 1
+        if self.raw:
+            if self.file is None:
+                with open(self.path + '.json', 'w') as f:
+                    json.dump({'shape': list(pixels.shape), 'dtype': 'uint8'}, f)
+                self.file = open(self.path, 'ab')
+            self.file.write(pixels.tobytes())
+        else:
+            Image.fromarray(pixels).save(os.path.join(self.path, f"frame-{self.written:06d}.png"))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def readRawFrames(path):
+    """Frames written by a .rgb FrameCapture as a (frames, height, width, 3) memmap"""
+    with open(path + '.json') as f:
+        shape = tuple(json.load(f)['shape'])
+    frames = os.path.getsize(path) // int(np.prod(shape))
+    return np.memmap(path, dtype=np.uint8, mode='r', shape=(frames,) + shape)
+
+
+def pasteImage(frame, image, x=0, y=0):
+    """
+    Paste a PIL image into an (height, width, 3) frame with its top left corner
+    at x, y, clipped to the frame.
+
+    :return: Number of pixels written.
+    """
+    pixels = np.asarray(image.convert('RGB'))
+    r0, c0 = max(0, y), max(0, x)
+    r1 = min(frame.shape[0], y + pixels.shape[0])
+    c1 = min(frame.shape[1], x + pixels.shape[1])
+    if r1 <= r0 or c1 <= c0:
+        return 0
+    frame[r0:r1, c0:c1] = pixels[r0 - y:r1 - y, c0 - x:c1 - x]
+    return (r1 - r0) * (c1 - c0)
+
+
+class FrameCanvas():
+    def __init__(self, width, height, matrix=None):
+        """Offscreen canvas backed by an (height, width, 3) uint8 array"""
+        self.width = width
+        self.height = height
+        self.pixels = np.zeros((height, width, 3), dtype=np.uint8)
+        self.matrix = matrix
+
+    def account(self, calls, pixels):
+        if self.matrix is not None:
+            self.matrix.calls += calls
+            self.matrix.pixelsWritten += pixels
+
+    def Clear(self):
+        self.pixels.fill(0)
+        self.account(1, self.pixels.shape[0] * self.pixels.shape[1])
+
+    def Fill(self, red, green, blue):
+        self.pixels[:] = (red, green, blue)
+        self.account(1, self.pixels.shape[0] * self.pixels.shape[1])
+
+    def SetPixel(self, x, y, red, green, blue):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[y, x] = (red, green, blue)
+        self.account(1, 1)
+
+    def SetImage(self, image, offset_x=0, offset_y=0, unsafe=True):
+        """Copy a PIL image onto the canvas with its top left corner at the offset, clipped to the canvas"""
+        self.account(1, pasteImage(self.pixels, image, offset_x, offset_y))
+
+
+class RGBMatrix():
+    def __init__(self, rows=None, chains=None, parallel=None, options=None, timing=None, capture=None, realtime=False):
+        """
+        Emulated RGBMatrix. Drawing on the matrix itself draws on the frame being
+        shown, as with the real one; SwapOnVSync shows a canvas and hands back the
+        one shown before.
+
+        :param options: RGBMatrixOptions, the geometry defaults to one 32x32 panel.
+        :param timing: PanelTiming, defaults to one built from the options.
+        :param capture: FrameCapture every shown frame is written to.
+        :param realtime: Make SwapOnVSync sleep for the modelled drawing cost and
+            until the next refresh, instead of only accounting for it.
+        """
+        if options is None:
+            options = RGBMatrixOptions()
+            options.rows = rows or options.rows
+            options.chain_length = chains or options.chain_length
+            options.parallel = parallel or options.parallel
+        self.options = options
+        self.width = options.cols * options.chain_length
+        self.height = options.rows * options.parallel
+        self.brightness = options.brightness
+        self.timing = timing or PanelTiming.fromOptions(options)
+        self.capture = capture
+        self.realtime = realtime
+
+        self.front = FrameCanvas(self.width, self.height, self)
+        self.started = time.perf_counter()
+        self.modelTime = 0.0        # panel clock of the model, seconds since started
+        self.swaps = 0
+        self.calls = 0
+        self.pixelsWritten = 0
+        self.drawSeconds = 0.0      # modelled CPU time of the drawing calls
+        self.vsyncSeconds = 0.0     # modelled time spent waiting for the refresh
+        self.accounted = (0, 0)
+
+    def configureFromEnvironment(self):
+        """Capture to $PANEL_CAPTURE and run in real time if $PANEL_REALTIME is set"""
+        path = os.getenv('PANEL_CAPTURE')
+        if path:
+            self.capture = FrameCapture(path)
+        self.realtime = bool(os.getenv('PANEL_REALTIME'))
+        return self
+
+    @property
+    def pixels(self):
+        """What the panel shows now"""
+        return self.front.pixels
+
+    def CreateFrameCanvas(self):
+        return FrameCanvas(self.width, self.height, self)
+
+    def Clear(self):
+        self.front.Clear()
+
+    def Fill(self, red, green, blue):
+        self.front.Fill(red, green, blue)
+
+    def SetPixel(self, x, y, red, green, blue):
+        self.front.SetPixel(x, y, red, green, blue)
+
+    def SetImage(self, image, offset_x=0, offset_y=0, unsafe=True):
+        self.front.SetImage(image, offset_x, offset_y, unsafe)
+
+    def SwapOnVSync(self, canvas, framerate_fraction=1):
+        """Show canvas from the next refresh on, returns the canvas shown until now"""
+        calls, pixels = self.calls - self.accounted[0], self.pixelsWritten - self.accounted[1]
+        self.accounted = (self.calls, self.pixelsWritten)
+        draw = self.timing.drawSeconds(calls, pixels)
+        self.drawSeconds += draw
+
+        # the model clock never runs behind the wall clock, drawing happens on top of it
+        now = max(self.modelTime, time.perf_counter() - self.started) + draw
+        vsync = self.timing.nextVSync(now, framerate_fraction)
+        self.vsyncSeconds += vsync - now
+        self.modelTime = vsync
+        if self.realtime:
+            delay = vsync - (time.perf_counter() - self.started)
+            if delay > 0:
+                time.sleep(delay)
+
+        previous, self.front = self.front, canvas
+        self.swaps += 1
+        if self.capture is not None:
+            self.capture.write(canvas.pixels)
+        return previous
+
+    def stats(self):
+        """Counters of the emulated panel, drawing figures are per shown frame"""
+        frames = max(self.swaps, 1)
+        return {
+            'refreshHz'       : self.timing.refreshHz,
+            'swaps'           : self.swaps,
+            'callsPerFrame'   : self.calls / frames,
+            'pixelsPerFrame'  : self.pixelsWritten / frames,
+            'drawMsPerFrame'  : self.drawSeconds / frames * 1000,
+            'vsyncMsPerFrame' : self.vsyncSeconds / frames * 1000,
+        }
+
+
+class Color():
+    def __init__(self, red=0, green=0, blue=0):
+        self.red = red
+        self.green = green
+        self.blue = blue
+
+
+class Font():
+    def __init__(self):
+        self.bdf = None
+        self.height = 0
+        self.baseline = 0
+
+    def LoadFont(self, path):
+        self.bdf = BdfFont(path)
+        self.height = self.bdf.height
+        self.baseline = self.bdf.ascent
+
+    def CharacterWidth(self, char):
+        glyph = self.bdf.glyph(chr(char) if isinstance(char, int) else char)
+        return -1 if glyph is None else glyph[1]
+
+
+def DrawText(canvas, font, x, y, color, text):
+    """Draw text with its baseline at y, returns the advance in pixels"""
+    mask = font.bdf.render(text)
+    top = y - font.bdf.ascent
+    rows, cols = np.nonzero(mask)
+    rows += top
+    cols += int(x)
+    inside = (rows >= 0) & (rows < canvas.height) & (cols >= 0) & (cols < canvas.width)
+    if isinstance(canvas, FrameCanvas):
+        canvas.pixels[rows[inside], cols[inside]] = (color.red, color.green, color.blue)
+        canvas.account(1, int(inside.sum()))
+    else:
+        for row, col in zip(rows[inside].tolist(), cols[inside].tolist()):
+            canvas.SetPixel(col, row, color.red, color.green, color.blue)
+    return mask.shape[1]
+
+
+class graphics():
+    """Stands in for rgbmatrix.graphics"""
+    Color = Color
+    Font = Font
+    DrawText = staticmethod(DrawText)
+
+
+class SampleBase():
+    """
+    Stands in for the samplebase module of the rpi-rgb-led-matrix samples. The
+    panel options come from matrixConfig instead of the command line.
+    """
+    def __init__(self, *args, **kwargs):
+        self.parser = argparse.ArgumentParser()
+
+    def usleep(self, value):
+        time.sleep(value / 1000000.0)
+
+    def run(self):
+        print("Running")
+
+    def process(self):
+        from matrixConfig import getMatrix
+        self.args = self.parser.parse_known_args()[0]
+        self.matrix = getMatrix()
+        try:
+            # Start loop
+            print("Press CTRL-C to stop sample")
+            self.run()
+        except KeyboardInterrupt:
+            print("Exiting\n")
+            sys.exit(0)
+        return True
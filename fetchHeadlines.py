@@ -1,59 +1,131 @@
 #!/usr/bin/env python
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import threading
+import time
 import os
 
 # Load .env file into environment variables
 load_dotenv()
 
-def fetch_headlines(option, top_headlines=5):
-    """
-    Fetch top headlines from the New York Times API for a specific category.
-    
-    :param option(s): The category of news. The possible section value are: 
-        arts, automobiles, books/review, business, fashion, food, health, 
-        home, insider, magazine, movies, nyregion, obituaries, opinion, politics, 
-        realestate, science, sports, sundayreview, technology, theater, t-magazine, 
-        travel, upshot, us, and world.
-    :param top_headlines: Number of top headlines to fetch (default is 5).
-    :return: A string containing the top headlines joined by '. ' or an error message.
-    """
-    headlines = []
-    if isinstance(option,str):
-        url = f"https://api.nytimes.com/svc/topstories/v2/{option}.json?api-key={os.getenv('NYT_API_KEY')}"
+NYT_TOP_STORIES = "https://api.nytimes.com/svc/topstories/v2"
 
-        try:
-            # Send GET request
-            response = requests.get(url)
-            response.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
 
-            # Parse the JSON response
-            data = response.json()
-            headlines = [item['title'] for item in data['results'][:top_headlines]]
-            return '. '.join(headlines)
+class HeadlineFetcher():
+    def __init__(self, base_url=NYT_TOP_STORIES, timeout=10, ttl=300, max_workers=6):
+        """
+        Fetch top stories sections concurrently over one pooled session.
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching headlines: {e}")
-            return "-- ERROR --"
-        
-    elif isinstance(option,list):
-        for option_x in option:
-            url = f"https://api.nytimes.com/svc/topstories/v2/{option_x}.json?api-key={os.getenv('NYT_API_KEY')}"
+        Each section is cached with its ETag / Last-Modified. Within ttl seconds the
+        cached titles are returned without a request, after that a conditional GET
+        is sent and a 304 reply costs no payload.
 
-            try:
-                # Send GET request
-                response = requests.get(url)
-                response.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
+        :param base_url: Top stories endpoint, point it at a local server for testing.
+        :param timeout: Seconds to wait for each request before giving up.
+        :param ttl: Seconds a section is served from cache before it is revalidated.
+        :param max_workers: Sections fetched at the same time.
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.ttl = ttl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='headlines')
+        self.cache = {}     # section -> {'titles', 'etag', 'modified', 'fetched'}
+        self.lock = threading.Lock()
+
+    def section(self, section):
+        """
+        All titles of one section, from cache when fresh. Raises RequestException if
+        the request fails and nothing is cached for the section.
+        """
+        with self.lock:
+            entry = self.cache.get(section)
+        if entry is not None and time.monotonic() - entry['fetched'] < self.ttl:
+            return entry['titles']
 
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['modified']:
+                headers['If-Modified-Since'] = entry['modified']
+        url = f"{self.base_url}/{section}.json"
+
+        try:
+            # Send GET request
+            response = self.session.get(url, params={'api-key': os.getenv('NYT_API_KEY')},
+                                        headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and entry is not None:
+                titles = entry['titles']
+            else:
+                response.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
                 # Parse the JSON response
-                data = response.json()
-                headlines += [item['title'] for item in data['results'][:top_headlines]]
+                titles = [item['title'] for item in response.json()['results']]
+        except requests.exceptions.RequestException as e:
+            if entry is None:
+                raise
+            print(f"Error fetching headlines, using cached {section}: {e}")
+            return entry['titles']
+
+        # a 304 may leave the validators out, keep the ones we sent
+        previous = entry or {'etag': None, 'modified': None}
+        with self.lock:
+            self.cache[section] = {
+                'titles'   : titles,
+                'etag'     : response.headers.get('ETag', previous['etag']),
+                'modified' : response.headers.get('Last-Modified', previous['modified']),
+                'fetched'  : time.monotonic(),
+            }
+        return titles
 
+    def fetch(self, option, top_headlines=5):
+        """Same contract as fetch_headlines, with the sections of a list fetched concurrently"""
+        if isinstance(option, str):
+            try:
+                return '. '.join(self.section(option)[:top_headlines])
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching headlines: {e}")
+                return "-- ERROR --"
+
+        headlines = []
+        futures = [self.pool.submit(self.section, option_x) for option_x in option]
+        for future in futures:      # keep the order the sections were asked for
+            try:
+                headlines += future.result()[:top_headlines]
             except requests.exceptions.RequestException as e:
                 print(f"Error fetching headlines: {e}")
-                # headlines +=  "-- ERROR --"
         return '. '.join(headlines) + ". "
-    
+
+
+_fetchers = {}
+
+def fetch_headlines(option, top_headlines=5, base_url=NYT_TOP_STORIES, timeout=10):
+    """
+    Fetch top headlines from the New York Times API for a specific category.
+
+    :param option(s): The category of news. The possible section value are:
+        arts, automobiles, books/review, business, fashion, food, health,
+        home, insider, magazine, movies, nyregion, obituaries, opinion, politics,
+        realestate, science, sports, sundayreview, technology, theater, t-magazine,
+        travel, upshot, us, and world.
+    :param top_headlines: Number of top headlines to fetch (default is 5).
+    :param base_url: Top stories endpoint, point it at a local server for testing.
+    :param timeout: Seconds to wait for each request before giving up.
+    :return: A string containing the top headlines joined by '. ' or an error message.
+
+    Calls share one HeadlineFetcher per endpoint, so repeated calls reuse its
+    connections and section cache.
+    """
+    key = (base_url, timeout)
+    if key not in _fetchers:
+        _fetchers[key] = HeadlineFetcher(base_url=base_url, timeout=timeout)
+    return _fetchers[key].fetch(option, top_headlines)
+
 # Example usage
 if __name__ == "__main__":
     category = "technology"  # Change to the desired category
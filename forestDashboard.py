@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# Terminal status for the display apps, refreshed at a capped rate and only
+# rewriting the fields that changed.
+import sys
+import time
+
+
+# Rows of (label, key) shown by ForestFire.run
+FOREST_LAYOUT = [
+    [('Under Growth', 'alive'), ('Old Growth', 'oldGrowth'), ('On Fire', 'burning'), ('Dead', 'dead'), ('Total', 'total')],
+    [('generations/s', 'simRate'), ('frames/s', 'displayRate'), ('cycle ms', 'cycleMs'), ('dashboard ms', 'dashboardMs')],
+    [('lookup ms', 'lookupMs'), ('draw ms', 'drawMs'), ('swap ms', 'swapMs')],
+    [('dropped cycles', 'droppedSteps'), ('dropped frames', 'droppedFrames')],
+]
+
+
+class TerminalDashboard():
+    def __init__(self, layout, title='Trees', max_hz=4, column_width=16, stream=sys.stdout, clock=time.perf_counter):
+        """
+        Fixed table drawn once, after which update() moves the cursor to each field
+        whose text changed and overwrites just that field.
+
+        :param layout: List of rows, each a list of (label, key) pairs.
+        :param title: Text centred in the top border.
+        :param max_hz: Most refreshes per second, extra update() calls are ignored.
+        :param column_width: Characters per field.
+        :param stream: Terminal to write to.
+        """
+        self.layout = layout
+        self.title = title
+        self.period = 1.0 / max_hz if max_hz else 0.0
+        self.width = column_width
+        self.stream = stream
+        self.clock = clock
+        self.fields = {}        # key -> (row, column) of the field on screen
+        self.shown = {}         # key -> text currently on screen
+        self.last = None
+        self.drawn = False
+
+    def due(self):
+        """True when enough time has passed for another refresh"""
+        return self.last is None or self.clock() - self.last >= self.period
+
+    def draw(self):
+        """Clear the screen and draw the borders and labels"""
+        columns = max(len(row) for row in self.layout)
+        inner = columns * (self.width + 1) - 1
+        lines = ["|" + f" {self.title} ".center(inner, "-") + "|"]
+        for row in self.layout:
+            lines.append("|" + "|".join(label.center(self.width) for label, key in row) + "|")
+            for i, (label, key) in enumerate(row):
+                self.fields[key] = (len(lines) + 1, 2 + i * (self.width + 1))
+            lines.append("|" + "|".join(" " * self.width for _ in row) + "|")
+            lines.append("|" + "-" * (len(row) * (self.width + 1) - 1) + "|")
+        self.stream.write("\033[H\033[J" + "\n".join(lines) + "\n")
+        self.shown = {}
+        self.drawn = True
+
+    def update(self, values, force=False):
+        """
+        Rewrite the fields whose values changed.
+
+        :param values: Maps layout keys to values; floats are shown with one decimal.
+        :param force: Refresh even if called sooner than max_hz allows.
+        :return: True if the screen was refreshed.
+        """
+        if not force and not self.due():
+            return False
+        self.last = self.clock()
+        if not self.drawn:
+            self.draw()
+
+        out = []
+        for key, value in values.items():
+            if key not in self.fields:
+                continue
+            text = f"{value:.1f}" if isinstance(value, float) else str(value)
+            text = text.center(self.width)[:self.width]
+            if self.shown.get(key) != text:
+                row, column = self.fields[key]
+                out.append(f"\033[{row};{column}H{text}")
+                self.shown[key] = text
+        if out:
+            # park the cursor below the table
+            out.append(f"\033[{1 + 3 * len(self.layout) + 1};1H")
+            self.stream.write("".join(out))
+            self.stream.flush()
+        return True
+
+
+class QuietDashboard():
+    """Drop-in replacement that never writes anything, for headless runs"""
+    def due(self):
+        return False
+
+    def update(self, values, force=False):
+        return False
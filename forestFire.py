@@ -1,39 +1,251 @@
 #!/usr/bin/env python
 # Display a runtext with double-buffering.
-try:
-    from samplebase import SampleBase
-    from rgbmatrix import RGBMatrix, RGBMatrixOptions
-    from rgbmatrix import graphics
-    # Configuration for the matrix
-    options = RGBMatrixOptions()
-    options.rows = 32
-    options.cols = 64
-    options.chain_length = 2
-    options.parallel = 1
-    options.hardware_mapping = 'adafruit-hat'
-    options.led_rgb_sequence = 'RBG'    
-    options.pixel_mapper_config = 'Rotate:180'
-
-    matrix = RGBMatrix(options = options)
-    runningOnPi = True
-except ModuleNotFoundError:
-    runningOnPi = False
-    class matrix:
-        def __init__(self):
-            self.width = 128
-            self.height = 32
-    matrix = matrix()
+from matrixConfig import getMatrix, PANEL_WIDTH, PANEL_HEIGHT
 
 from PIL import Image, ImageDraw
 import datetime
 import time
+import json
 import os
 import sys
 import numpy as np
+from enum import IntEnum
+from deltaDisplay import DeltaDisplay
+from frameScheduler import FrameScheduler
+from forestDashboard import TerminalDashboard, QuietDashboard, FOREST_LAYOUT
+from profiling import profiler, timed
+
+
+class TreeState(IntEnum):
+    """Values stored in the forest grid"""
+    DEAD = 0
+    ALIVE = 1
+    BURNING = 2
+    OLD_GROWTH = 3
+
+
+# Simulation engines selectable through ForestFire(engine=...)
+#   'loop'     : reference per-cell Python loops, one uniform draw per test
+#   'numpy'    : whole-grid passes, one batched uniform draw per pass
+#   'frontier' : only visits burning cells, trees and their neighbours, and
+#                draws only the events that happen, so cost follows activity not area
+ENGINES = ('loop', 'numpy', 'frontier')
+
+# Row and column steps to the N, S, W and E neighbours
+DIRECTIONS = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)])
+
+# Colour palettes, one row per tree state: dead, alive, burning, old growth
+PALETTES = {
+    'Green-Red'   : np.array([(0, 0, 0), (70, 125, 4), (252, 94, 3), (2, 234, 86)], dtype=np.uint8),
+    'Purple-Pink' : np.array([(0, 0, 0), (70, 25, 140), (210, 94, 190), (200, 234, 0)], dtype=np.uint8),
+    'Yellow-Blue' : np.array([(0, 0, 0), (170, 125, 10), (0, 94, 245), (210, 34, 30)], dtype=np.uint8),
+    'Secondary'   : np.array([(0, 0, 0), (255, 0, 255), (255, 255, 0), (0, 255, 255)], dtype=np.uint8),
+}
+
+# Default rates of the model, per tree type
+DEFAULT_PROBABILITIES = {
+    'BasicTree' : {
+        'GrowthSpreadRate'  : 0.02,
+        'NaturalDeathRate'  : 0.01,
+        'LightningRate'     : 0.00001,      # 0.0000001
+        'FireSpreadRate'    : 0.9,
+        'FireDeathRate'     : 0.1,
+        'FireExtinguishRate': 0.1
+    },
+    'OldGrowth' : {
+        'GrowthSpreadRate'  : 0.001,
+        'NaturalDeathRate'  : 0.0005,
+        'LightningRate'     : 0.0000005,    # 0.000005
+        'FireSpreadRate'    : 0.3,   # 0.03 # Resistance to burning
+        'FireDeathRate'     : 0.001,
+        'FireExtinguishRate': 0.01
+    }
+}
+
+
+class GridWorkspace():
+    """
+    Scratch arrays reused by the whole-grid passes so a steady-state cycle
+    allocates nothing. The shape may carry leading axes for a stack of forests.
+    """
+    def __init__(self, shape):
+        self.draws = np.empty(shape, dtype=np.float64)   # uniform draws for the pass
+        self.prob = np.empty(shape, dtype=np.float64)    # per-cell thresholds
+        self.count = np.empty(shape, dtype=np.uint8)     # neighbour counts
+        self.source = np.empty(shape, dtype=bool)        # cells the neighbours are counted from
+        self.target = np.empty(shape, dtype=bool)        # cells that may change
+        self.mask = np.empty(shape, dtype=bool)          # cells that do change
+
+
+def neighborCount(mask, out=None):
+    """
+    Count how many of the N/S/E/W neighbours of every cell are set in a boolean mask.
+    Cells off the edge of the grid count as unset. The grid is the last two axes,
+    so a stack of forests can be counted in one go.
+    """
+    if out is None:
+        out = np.empty(mask.shape, dtype=np.uint8)
+    out.fill(0)
+    np.add(out[..., 1:, :], mask[..., :-1, :], out=out[..., 1:, :])     # neighbour to the north
+    np.add(out[..., :-1, :], mask[..., 1:, :], out=out[..., :-1, :])    # neighbour to the south
+    np.add(out[..., :, 1:], mask[..., :, :-1], out=out[..., :, 1:])     # neighbour to the west
+    np.add(out[..., :, :-1], mask[..., :, 1:], out=out[..., :, :-1])    # neighbour to the east
+    return out
+
+
+def _spreadMask(forest, draws, SourceType, TargetType, rate, work):
+    """
+    Mark the TargetType cells that pick up SourceType from a neighbour into work.mask.
+    Each neighbour gets its own chance, so k neighbours spread with 1 - (1 - rate)**k,
+    which is tested as draws + (1 - rate)**k < 1.
+    """
+    np.equal(forest, SourceType, out=work.source)
+    neighborCount(work.source, out=work.count)
+    np.power(np.subtract(1, rate), work.count, out=work.prob)
+    np.add(work.prob, draws, out=work.prob)
+    np.less(work.prob, 1, out=work.mask)
+    np.equal(forest, TargetType, out=work.target)
+    np.logical_and(work.mask, work.target, out=work.mask)
+
+
+def burnGrid(forest, out, draws, TreeType, FireSpreadRate, FireDeathRate, FireExtinguishRate, work):
+    """
+    Whole-grid version of ForestFire.burn, writes the next forest into out.
+
+    :param draws: Uniform [0, 1) numbers, one per cell.
+    :param work: GridWorkspace of the same shape as forest.
+
+    Rates may be scalars or arrays that broadcast against the grid. A burning tree
+    dies with FireDeathRate, otherwise goes out with FireExtinguishRate, so both
+    outcomes are read off the same draw.
+    """
+    np.copyto(out, forest)
+    _spreadMask(forest, draws, TreeState.BURNING, TreeType, FireSpreadRate, work)
+    np.copyto(out, TreeState.BURNING, where=work.mask, casting='unsafe')                  # Set fire
+
+    # work.source still marks the burning trees
+    goesOut = np.add(FireDeathRate, np.multiply(np.subtract(1, FireDeathRate), FireExtinguishRate))
+    np.less(draws, goesOut, out=work.mask)
+    np.logical_and(work.mask, work.source, out=work.mask)
+    np.copyto(out, TreeType, where=work.mask, casting='unsafe')                           # Tree fire goes out
+    np.less(draws, FireDeathRate, out=work.mask)
+    np.logical_and(work.mask, work.source, out=work.mask)
+    np.copyto(out, TreeState.DEAD, where=work.mask, casting='unsafe')                     # Tree is burned down
+    return out
+
+
+def growGrid(forest, out, draws, TreeType, GrowthSpreadRate, NaturalDeathRate, LightningRate, work):
+    """
+    Whole-grid version of ForestFire.grow, writes the next forest into out.
+
+    :param draws: Uniform [0, 1) numbers, one per cell.
+    :param work: GridWorkspace of the same shape as forest.
+
+    In the loop engine lightning is tested after natural death and wins, so a tree burns
+    with LightningRate and dies with (1 - LightningRate) * NaturalDeathRate.
+    """
+    np.copyto(out, forest)
+    _spreadMask(forest, draws, TreeType, TreeState.DEAD, GrowthSpreadRate, work)
+    np.copyto(out, TreeType, where=work.mask, casting='unsafe')                           # tree grows
+
+    # work.source still marks the trees of TreeType
+    dies = np.add(LightningRate, np.multiply(np.subtract(1, LightningRate), NaturalDeathRate))
+    np.less(draws, dies, out=work.mask)
+    np.logical_and(work.mask, work.source, out=work.mask)
+    np.copyto(out, TreeState.DEAD, where=work.mask, casting='unsafe')                     # Tree dies
+    np.less(draws, LightningRate, out=work.mask)
+    np.logical_and(work.mask, work.source, out=work.mask)
+    np.copyto(out, TreeState.BURNING, where=work.mask, casting='unsafe')                  # Tree gets hit by Lightning
+    return out
+
+
+def bernoulliPositions(prng, n, p):
+    """
+    Positions in range(n) where independent trials with probability p succeed.
+    The gaps between successes are geometric, so only the successes are drawn
+    and the cost follows n * p instead of n.
+    """
+    if p <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if p >= 1:
+        return np.arange(n)
+    expected = n * p
+    chunk = int(expected + 4 * np.sqrt(expected) + 16)
+    positions = np.cumsum(prng.geometric(p, size=chunk)) - 1
+    while positions[-1] < n:
+        more = np.cumsum(prng.geometric(p, size=chunk)) + positions[-1]
+        positions = np.concatenate((positions, more))
+    return positions[:np.searchsorted(positions, n)]
+
+
+class ForestStats():
+    def __init__(self, history=1024):
+        """
+        Per-state cell counts, kept up to date either incrementally from the
+        transitions an engine applies (move) or by a bincount of the grid (recount).
+
+        :param history: Number of generations kept in the ring buffer of counts.
+        """
+        self.counts = np.zeros(len(TreeState), dtype=np.int64)
+        self.history = np.zeros((history, len(TreeState)), dtype=np.int64)
+        self.generation = 0
+        self.recorded = 0       # rows of history actually filled, at most len(history) of them kept
+
+    def __getitem__(self, state):
+        return int(self.counts[state])
+
+    def recount(self, forest):
+        """Count every state in the grid, O(cells) but without the sort np.unique does"""
+        self.counts[:] = np.bincount(forest.reshape(-1), minlength=len(TreeState))
+
+    def move(self, old, new, n):
+        """Record n cells going from state old to state new"""
+        self.counts[old] -= n
+        self.counts[new] += n
+
+    def record(self):
+        """Push the current counts into the history ring"""
+        self.history[self.generation % len(self.history)] = self.counts
+        self.generation += 1
+        self.recorded += 1
+
+    def restore(self, generation, history):
+        """Continue at generation with history (oldest first, as recent() returns it) as the counts recorded so far"""
+        history = history[len(history) - min(len(history), len(self.history)):]
+        self.generation = generation
+        self.recorded = len(history)
+        self.history[np.arange(generation - len(history), generation) % len(self.history)] = history
+
+    def recent(self, n=None):
+        """Counts of the last n recorded generations (all kept ones by default), oldest first"""
+        kept = min(self.recorded, len(self.history))
+        n = kept if n is None else min(n, kept)
+        rows = np.arange(self.generation - n, self.generation) % len(self.history)
+        return self.history[rows]
+
+
+def plantForest(prng, height, width, density):
+    """Create a forest grid with randomly placed young trees and one old growth tree"""
+    size = width * height
+
+    # Initialize forest array and reshape
+    forest = np.zeros((height, width), dtype=np.uint8)  # Create a 2D array
+    num_ones = int(size * density)
+    indices = prng.choice(size, num_ones, replace=False)
+
+    forest.flat[indices] = TreeState.ALIVE
+
+    # Initialize random old growth trees
+    StartOldGrowth=1
+    oldgrowth_indices = prng.choice(size, StartOldGrowth, replace=False)
+    for index in oldgrowth_indices:
+        row, col = divmod(index, width)
+        forest[row, col] = TreeState.OLD_GROWTH
+    return forest
 
 
 class ForestFire():
-    def __init__(self, timestep, probs, density=0.000245, num_burn_points=3, seed = 1000, *args, **kwargs):
+    def __init__(self, timestep, probs, density=0.000245, num_burn_points=3, seed = 1000, engine='numpy', palette='Yellow-Blue', width=None, height=None, *args, **kwargs):
         """
         Initialize the ForestFire class with customizable inputs.
         
@@ -42,81 +254,287 @@ class ForestFire():
         :param sigmaProb: Spread probability for fire.
         :param density: Density of trees in the forest, 1 for full.
         :param num_burn_points: Number of initial random fire points.
+        :param engine: 'numpy' for whole-grid passes, 'frontier' for sparse fires or
+            'loop' for the per-cell reference.
+        :param palette: Name of an entry in PALETTES, or a (4, 3) array of RGB rows per state.
+        :param width: Forest width in cells, defaults to the panel width.
+        :param height: Forest height in cells, defaults to the panel height.
         """
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, got {engine!r}")
         self.timestep = timestep
         self.probArray = probs
         self.density = density
         self.num_burn_points = num_burn_points
+        self.engine = engine
         # Create a PRNG object with a specific seed
         self.prng = np.random.default_rng(seed)       
 
-        width, height = matrix.width, matrix.height
-
-        size = width * height
-
-        # Initialize forest array and reshape
-        self.forest = np.zeros((height, width), dtype=int)  # Create a 2D array
-        num_ones = int(size * self.density)
-        indices = self.prng.choice(size, num_ones, replace=False)
-
-        self.forest.flat[indices] = 1
-
-        # Initialize random old growth trees
-        StartOldGrowth=1
-        oldgrowth_indices = self.prng.choice(size, StartOldGrowth, replace=False)
-        for index in oldgrowth_indices:
-            row, col = divmod(index, width)
-            self.forest[row, col] = 3
-
-    def run(self):
-        def clear_terminal():
-            print("\033[H\033[J", end="")  # ANSI sequence to clear screen and reset cursor
-
-        while True:
-            self.cycle()       # perscribed grow-burn cycle 
-            clear_terminal()  # Clear the screen
-            # get counts for the various tree states
-            unique, counts = np.unique(self.forest, return_counts=True)
-            treeCount = dict(zip(unique, counts))
-            try:
-                fire = treeCount[2]
-            except KeyError:
-                fire = 0
-            print("\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n|-- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- Trees -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- --|")
-            print("|\tUnder Growth\t|\tOld Growth\t|\tOn Fire  \t|\tDead    \t|\tTotal     \t|")
-            print(f"|\t   {treeCount[1]}  \t|\t    {treeCount[3]}   \t|\t   {fire}    \t|\t {treeCount[0]}     \t|\t  {self.forest.size}  \t|")  # Print the new value
-            print("|-- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- --|")
+        width = width or PANEL_WIDTH
+        height = height or PANEL_HEIGHT
+        self.forest = plantForest(self.prng, height, width, self.density)
+
+        # Each pass writes the next generation into the back buffer and swaps,
+        # so self.forest always names the current front buffer
+        self.back = np.empty_like(self.forest)
+        self.work = GridWorkspace(self.forest.shape)
+        self.refreshFrontier()
+
+        # Population counts, updated by the frontier engine as it goes and by a
+        # single bincount per cycle for the others
+        self.stats = ForestStats()
+        self.stats.recount(self.forest)
+
+        # Rendering reuses one RGB buffer and one image for every frame
+        self.setPalette(palette)
+        self.imageBuffer = np.zeros((height, width, 3), dtype=np.uint8)
+        self.image = Image.new('RGB', (width, height))
+
+    def setPalette(self, palette):
+        """Select a named palette from PALETTES or pass a (4, 3) table of RGB rows per state"""
+        if isinstance(palette, str):
+            palette = PALETTES[palette]
+        palette = np.ascontiguousarray(palette, dtype=np.uint8)
+        if palette.shape != (4, 3):
+            raise ValueError(f"palette must have shape (4, 3), got {palette.shape}")
+        self.palette = palette
+
+    def run(self, display_fps=None, output='dashboard', dashboard_hz=4, recorder=None, checkpoint=None, checkpoint_every=1000):
+        """
+        Run the simulation at 1 / timestep cycles per second and show it at display_fps.
+
+        :param display_fps: Screen refreshes per second, None to refresh after every cycle.
+        :param output: 'dashboard' for the terminal table, 'quiet' for no terminal output.
+        :param dashboard_hz: Most terminal refreshes per second.
+        :param recorder: forestRecorder.GenerationRecorder that every generation is appended to.
+        :param checkpoint: Checkpoint file; resumed from if it exists and rewritten every
+            checkpoint_every generations. On resume the recording is cut back to the
+            checkpoint's generation, so it does not hold frames of two timelines.
+        """
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self.loadCheckpoint(checkpoint)
+            if recorder is not None and recorder.count > self.stats.generation:
+                recorder.truncate(self.stats.generation)
+        if output not in ('dashboard', 'quiet'):
+            raise ValueError(f"output must be 'dashboard' or 'quiet', got {output!r}")
+        dashboard = TerminalDashboard(FOREST_LAYOUT, max_hz=dashboard_hz) if output == 'dashboard' else QuietDashboard()
+
+        # Only the cells that changed since the last frame are pushed to the panel
+        display = DeltaDisplay(getMatrix(), self.palette)
+        scheduler = FrameScheduler(
+            sim_rate=1 / self.timestep if self.timestep > 0 else None,
+            display_fps=display_fps)
+
+        # Smoothed stage timings in ms
+        timings = {'cycleMs': 0.0, 'lookupMs': 0.0, 'drawMs': 0.0, 'swapMs': 0.0, 'dashboardMs': 0.0}
+        def smoothTiming(key, seconds):
+            timings[key] += 0.1 * (seconds * 1000 - timings[key])
+
+        def step():
+            start = time.perf_counter()
+            self.cycle()       # perscribed grow-burn cycle
+            smoothTiming('cycleMs', time.perf_counter() - start)
+            if recorder is not None:
+                recorder.append(self.forest)
+            if checkpoint is not None and self.stats.generation % checkpoint_every == 0:
+                self.saveCheckpoint(checkpoint)
+
+        def render():
             # Send to Panel
-            if runningOnPi:
-                matrix.SetImage(self.forestToImage().convert('RGB'))
-            # wait
-            # input("continue")
-            time.sleep(self.timestep)
-
+            display.show(self.forest)
+            for key, seconds in zip(('lookupMs', 'drawMs', 'swapMs'), display.stageSeconds):
+                smoothTiming(key, seconds)
+            if dashboard.due():
+                start = time.perf_counter()
+                # get counts for the various tree states
+                treeCount = self.stats
+                dashboard.update(dict(
+                    alive=treeCount[TreeState.ALIVE],
+                    oldGrowth=treeCount[TreeState.OLD_GROWTH],
+                    burning=treeCount[TreeState.BURNING],
+                    dead=treeCount[TreeState.DEAD],
+                    total=self.forest.size,
+                    **scheduler.rates(),
+                    **timings))
+                smoothTiming('dashboardMs', time.perf_counter() - start)
+
+        scheduler.run(step, render)
+
+    @timed('forest.cycle')
     def cycle(self):
         
-        self.burn( TreeType=1,
+        self.burn( TreeType=TreeState.ALIVE,
             FireSpreadRate          =self.probArray['BasicTree']['FireSpreadRate'], 
             FireDeathRate           =self.probArray['BasicTree']['FireDeathRate'], 
             FireExtinguishRate      =self.probArray['BasicTree']['FireExtinguishRate'] )  # Spread the fire
-        self.grow(  TreeType=1,
+        self.grow(  TreeType=TreeState.ALIVE,
             GrowthSpreadRate        =self.probArray['BasicTree']['GrowthSpreadRate'], 
             NaturalDeathRate        =self.probArray['BasicTree']['NaturalDeathRate'], 
             LightningRate           =self.probArray['BasicTree']['LightningRate'] )  # Grow back trees
-        self.burn( TreeType=3,
+        self.burn( TreeType=TreeState.OLD_GROWTH,
             FireSpreadRate          =self.probArray['OldGrowth']['FireSpreadRate'], 
             FireDeathRate           =self.probArray['OldGrowth']['FireDeathRate'], 
             FireExtinguishRate      =self.probArray['OldGrowth']['FireExtinguishRate'] )  # Spread the fire
-        self.grow(  TreeType=3,
+        self.grow(  TreeType=TreeState.OLD_GROWTH,
             GrowthSpreadRate        =self.probArray['OldGrowth']['GrowthSpreadRate'], 
             NaturalDeathRate        =self.probArray['OldGrowth']['NaturalDeathRate'], 
             LightningRate           =self.probArray['OldGrowth']['LightningRate'] )  # Grow back trees
+        if self.engine != 'frontier':
+            self.stats.recount(self.forest)
+        self.stats.record()
 
-
+    @timed('forest.burn')
     def burn(self, TreeType, FireSpreadRate=0.9, FireDeathRate=0.1, FireExtinguishRate=0.1):
         """Simulate fire spreading based on adjacency to burning trees"""
+        if self.engine == 'loop':
+            self.burnLoop(TreeType, FireSpreadRate, FireDeathRate, FireExtinguishRate)
+        elif self.engine == 'frontier':
+            self.burnFrontier(TreeType, FireSpreadRate, FireDeathRate, FireExtinguishRate)
+        else:
+            self.prng.random(out=self.work.draws)
+            burnGrid(self.forest, self.back, self.work.draws, TreeType, FireSpreadRate, FireDeathRate, FireExtinguishRate, self.work)
+            self.swap()
+
+    @timed('forest.grow')
+    def grow(self, TreeType, GrowthSpreadRate=0.005, NaturalDeathRate=0.005, LightningRate=0.00005):
+        """Simulate trees growing based on adjacency to alive trees"""
+        if self.engine == 'loop':
+            self.growLoop(TreeType, GrowthSpreadRate, NaturalDeathRate, LightningRate)
+        elif self.engine == 'frontier':
+            self.growFrontier(TreeType, GrowthSpreadRate, NaturalDeathRate, LightningRate)
+        else:
+            self.prng.random(out=self.work.draws)
+            growGrid(self.forest, self.back, self.work.draws, TreeType, GrowthSpreadRate, NaturalDeathRate, LightningRate, self.work)
+            self.swap()
+
+    def swap(self):
+        """Make the back buffer the current forest"""
+        self.forest, self.back = self.back, self.forest
+
+    def snapshot(self):
+        """Copy of everything that determines the rest of the run: grid, PRNG state, generation and count history"""
+        return {
+            'forest'     : self.forest.copy(),
+            'prng'       : self.prng.bit_generator.state,
+            'generation' : self.stats.generation,
+            'history'    : self.stats.recent().copy(),
+        }
+
+    def restore(self, snapshot):
+        """Continue from a snapshot() taken from a forest of the same size"""
+        if snapshot['forest'].shape != self.forest.shape:
+            raise ValueError(f"snapshot is {snapshot['forest'].shape}, forest is {self.forest.shape}")
+        np.copyto(self.forest, snapshot['forest'])
+        self.prng.bit_generator.state = snapshot['prng']
+        self.refreshFrontier()
+        self.stats.recount(self.forest)
+        self.stats.restore(snapshot['generation'], snapshot['history'])
+
+    def saveCheckpoint(self, path):
+        """Write snapshot() to a .npz file, replacing any previous checkpoint atomically"""
+        snapshot = self.snapshot()
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, forest=snapshot['forest'], prng=json.dumps(snapshot['prng']),
+                     generation=snapshot['generation'], history=snapshot['history'])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def loadCheckpoint(self, path):
+        """restore() from a file written by saveCheckpoint"""
+        with np.load(path) as data:
+            self.restore({
+                'forest'     : data['forest'],
+                'prng'       : json.loads(str(data['prng'])),
+                'generation' : int(data['generation']),
+                'history'    : data['history'] if 'history' in data.files else np.zeros((0, len(TreeState)), dtype=np.int64),
+            })
+
+    def refreshFrontier(self):
+        """Rebuild the sorted lists of burning and tree cells, needed after self.forest is replaced"""
+        self.burningCells = np.flatnonzero(self.forest == TreeState.BURNING)
+        self.treeCells = {TreeType: np.flatnonzero(self.forest == TreeType)
+                          for TreeType in (TreeState.ALIVE, TreeState.OLD_GROWTH)}
+
+    def neighborCells(self, cells, directions):
+        """
+        Flat index of the neighbour of each flat cell index in the given DIRECTIONS rows.
+        :return: (neighbours, valid) where valid is False for neighbours off the grid.
+        """
+        height, width = self.forest.shape
+        rows, cols = np.divmod(cells, width)
+        rows = rows + DIRECTIONS[directions, 0]
+        cols = cols + DIRECTIONS[directions, 1]
+        valid = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        return np.where(valid, rows * width + cols, 0), valid
+
+    def burnFrontier(self, TreeType, FireSpreadRate=0.9, FireDeathRate=0.1, FireExtinguishRate=0.1):
+        """Burn pass that only visits the burning cells and their neighbours"""
+        forest = self.forest.reshape(-1)
+        burning = self.burningCells
+
+        # every burning cell gets its own chance to spread to each neighbour of TreeType
+        neighbors, valid = self.neighborCells(np.repeat(burning, 4), np.tile(np.arange(4), burning.size))
+        neighbors = neighbors[valid]
+        neighbors = neighbors[forest[neighbors] == TreeType]
+        ignite = np.unique(neighbors[self.prng.random(neighbors.size) < FireSpreadRate])
+
+        # burning trees die, otherwise may go out, read off one draw
+        draws = self.prng.random(burning.size)
+        goesOut = FireDeathRate + (1 - FireDeathRate) * FireExtinguishRate
+        burnedDown = burning[draws < FireDeathRate]
+        wentOut = burning[(draws >= FireDeathRate) & (draws < goesOut)]
+        forest[ignite] = TreeState.BURNING                  # Set fire
+        forest[burnedDown] = TreeState.DEAD                 # Tree is burned down
+        forest[wentOut] = TreeType                          # Tree fire goes out
+        self.burningCells = np.union1d(burning[draws >= goesOut], ignite)
+        trees = np.setdiff1d(self.treeCells[TreeType], ignite, assume_unique=True)
+        self.treeCells[TreeType] = np.union1d(trees, wentOut)
+
+        self.stats.move(TreeType, TreeState.BURNING, ignite.size)
+        self.stats.move(TreeState.BURNING, TreeState.DEAD, burnedDown.size)
+        self.stats.move(TreeState.BURNING, TreeType, wentOut.size)
+
+    def growFrontier(self, TreeType, GrowthSpreadRate=0.005, NaturalDeathRate=0.005, LightningRate=0.00005):
+        """
+        Grow pass over the trees of TreeType only, drawing just the positions of the
+        growth, death and lightning events among them.
+        """
+        forest = self.forest.reshape(-1)
+        trees = self.treeCells[TreeType]
+
+        # Each (tree, direction) pair is an independent growth attempt on the
+        # neighbour that way, so a dead cell next to k trees grows with 1-(1-p)^k.
+        # Sample the successful attempts and keep those that land on a dead cell
+        attempts = bernoulliPositions(self.prng, 4 * trees.size, GrowthSpreadRate)
+        sources, directions = np.divmod(attempts, 4)
+        neighbors, valid = self.neighborCells(trees[sources], directions)
+        neighbors = neighbors[valid]
+        grown = np.unique(neighbors[forest[neighbors] == TreeState.DEAD])  # a cell can be reached twice
+
+        # A tree is struck with LightningRate, otherwise dies with NaturalDeathRate
+        anyEvent = LightningRate + (1 - LightningRate) * NaturalDeathRate
+        hits = trees[bernoulliPositions(self.prng, trees.size, anyEvent)]
+        struck = self.prng.random(hits.size) * anyEvent < LightningRate
+
+        forest[grown] = TreeType                                # tree grows
+        forest[hits[~struck]] = TreeState.DEAD                  # Tree dies
+        forest[hits[struck]] = TreeState.BURNING                # Tree gets hit by Lightning
+        if struck.any():
+            self.burningCells = np.union1d(self.burningCells, hits[struck])
+        self.treeCells[TreeType] = np.union1d(np.setdiff1d(trees, hits, assume_unique=True), grown)
+
+        nStruck = int(np.count_nonzero(struck))
+        self.stats.move(TreeState.DEAD, TreeType, grown.size)
+        self.stats.move(TreeType, TreeState.DEAD, hits.size - nStruck)
+        self.stats.move(TreeType, TreeState.BURNING, nStruck)
+
+    def burnLoop(self, TreeType, FireSpreadRate=0.9, FireDeathRate=0.1, FireExtinguishRate=0.1):
+        """Reference per-cell burn pass"""
         height, width = self.forest.shape
-        new_forest = self.forest.copy()
+        new_forest = self.back
+        np.copyto(new_forest, self.forest)
 
         # Define directions for adjacent cells (N, S, E, W)
         directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
@@ -127,30 +545,31 @@ class ForestFire():
                     # Check if any of the adjacent cells is burning
                     for dx, dy in directions:
                         ni, nj = i + dx, j + dy
-                        if 0 <= ni < height and 0 <= nj < width and self.forest[ni, nj] == 2:
+                        if 0 <= ni < height and 0 <= nj < width and self.forest[ni, nj] == TreeState.BURNING:
                             if self.prng.uniform(0,1) < FireSpreadRate:  # Spread fire with a probability
-                                new_forest[i, j] = 2  # Set fire
+                                new_forest[i, j] = TreeState.BURNING  # Set fire
                                 break  # No need to check further neighbors
 
-                elif self.forest[i, j] == 2:  # Burning tree
+                elif self.forest[i, j] == TreeState.BURNING:  # Burning tree
                     if self.prng.uniform(0,1) < FireDeathRate:
-                        new_forest[i, j] = 0  # Tree is burned down
+                        new_forest[i, j] = TreeState.DEAD  # Tree is burned down
                     elif self.prng.uniform(0,1) < FireExtinguishRate:
                         new_forest[i, j] = TreeType  # Tree fire goes out
 
-        self.forest = new_forest
+        self.swap()
 
-    def grow(self, TreeType, GrowthSpreadRate=0.005, NaturalDeathRate=0.005, LightningRate=0.00005):
-        """Simulate trees growing based on adjacency to alive trees"""
+    def growLoop(self, TreeType, GrowthSpreadRate=0.005, NaturalDeathRate=0.005, LightningRate=0.00005):
+        """Reference per-cell grow pass"""
         height, width = self.forest.shape
-        new_forest = self.forest.copy()
+        new_forest = self.back
+        np.copyto(new_forest, self.forest)
 
         # Define directions for adjacent cells (N, S, E, W)
         directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
 
         for i in range(height):
             for j in range(width):
-                if self.forest[i, j] == 0:  # Tree is dead
+                if self.forest[i, j] == TreeState.DEAD:  # Tree is dead
                     # Check if any of the adjacent cells is alive
                     for dx, dy in directions:
                         ni, nj = i + dx, j + dy
@@ -162,82 +581,112 @@ class ForestFire():
                 # sometimes trees die
                 elif self.forest[i, j] == TreeType:
                     if self.prng.uniform(0,1) < NaturalDeathRate:
-                        new_forest[i, j] = 0  # Tree dies
+                        new_forest[i, j] = TreeState.DEAD  # Tree dies
                     if self.prng.uniform(0,1) < LightningRate:
-                        new_forest[i, j] = 2  # Tree gets hit by Lightning, set on fire
+                        new_forest[i, j] = TreeState.BURNING  # Tree gets hit by Lightning, set on fire
+
+        self.swap()
 
-        self.forest = new_forest
+    def forestToArray(self, out=None):
+        '''turn the forest array into an RGB array using the palette lookup table'''
+        if out is None:
+            out = self.imageBuffer
+        # one fancy-index pass, written straight into the reused buffer
+        np.take(self.palette, self.forest, axis=0, out=out, mode='clip')
+        return out
 
+    @timed('forest.forestToImage')
     def forestToImage(self):
-        '''turn the forest array into an image'''
-        height, width = self.forest.shape
-        image_data = np.zeros((height, width, 3), dtype=np.uint8)
+        '''turn the forest array into an image (the same image object is refilled every frame)'''
+        self.image.frombytes(self.forestToArray().data)
+        return self.image
 
-        # Define Colors:
+class ForestFireBatch():
+    def __init__(self, probs, seeds, density=0.000245, width=None, height=None):
+        """
+        Step many independent forests together without rendering or sleeping.
 
-        # Green - Red:
-        # alive = (70, 125, 4)
-        # oldGrowth = (2, 234, 86)
-        # burning = (252, 94, 3)
+        The forests are stacked into one (batch, height, width) grid and each keeps
+        its own PRNG, so forest b follows exactly the same run as
+        ForestFire(seed=seeds[b], engine='numpy') with the same probabilities.
 
-        # Purple - pink:
-        # alive = (70, 25, 140)
-        # oldGrowth = (200, 234, 0)
-        # burning = (210, 94, 190)
+        :param probs: One probabilities dict for every forest, or a list with one per seed.
+        :param seeds: Sequence of seeds, one per forest.
+        :param density: Density of trees in the forest, 1 for full.
+        :param width: Forest width in cells, defaults to the panel width.
+        :param height: Forest height in cells, defaults to the panel height.
+        """
+        width = width or PANEL_WIDTH
+        height = height or PANEL_HEIGHT
+        self.prngs = [np.random.default_rng(seed) for seed in seeds]
+        if isinstance(probs, dict):
+            probs = [probs] * len(self.prngs)
+        if len(probs) != len(self.prngs):
+            raise ValueError(f"got {len(probs)} probability sets for {len(self.prngs)} seeds")
+        self.probArrays = list(probs)
+
+        # Per-forest rates shaped (batch, 1, 1) so they broadcast over each grid
+        self.rates = {
+            treeName: {
+                rateName: np.array([p[treeName][rateName] for p in self.probArrays]).reshape(-1, 1, 1)
+                for rateName in probs[0][treeName]
+            }
+            for treeName in ('BasicTree', 'OldGrowth')
+        }
 
-        # Yellow - Blue:
-        alive = (170, 125, 10)
-        oldGrowth = (210, 34, 30)
-        burning = (0, 94, 245)
+        self.forest = np.stack([plantForest(prng, height, width, density) for prng in self.prngs])
+        self.back = np.empty_like(self.forest)
+        self.work = GridWorkspace(self.forest.shape)
 
-        # Secondary:
-        # alive = (255, 0, 255)
-        # oldGrowth = (0, 255, 255)
-        # burning = (255, 255, 0)    
+    def draw(self):
+        """Fill the workspace draws, each forest from its own PRNG"""
+        for b, prng in enumerate(self.prngs):
+            prng.random(out=self.work.draws[b])
 
-        dead = (0, 0, 0)
+    def cycle(self):
+        """One burn-grow cycle for every forest, in the same pass order as ForestFire.cycle"""
+        for treeName, TreeType in (('BasicTree', TreeState.ALIVE), ('OldGrowth', TreeState.OLD_GROWTH)):
+            rates = self.rates[treeName]
+            self.draw()
+            burnGrid(self.forest, self.back, self.work.draws, TreeType,
+                rates['FireSpreadRate'], rates['FireDeathRate'], rates['FireExtinguishRate'], self.work)
+            self.forest, self.back = self.back, self.forest
+            self.draw()
+            growGrid(self.forest, self.back, self.work.draws, TreeType,
+                rates['GrowthSpreadRate'], rates['NaturalDeathRate'], rates['LightningRate'], self.work)
+            self.forest, self.back = self.back, self.forest
+
+    def counts(self, out=None):
+        """Number of cells in each TreeState, shaped (batch, 4)"""
+        if out is None:
+            out = np.empty((len(self.prngs), len(TreeState)), dtype=np.int64)
+        cells = self.forest.shape[1] * self.forest.shape[2]
+        for state in (TreeState.ALIVE, TreeState.BURNING, TreeState.OLD_GROWTH):
+            np.equal(self.forest, state, out=self.work.mask)
+            self.work.mask.sum(axis=(1, 2), out=out[:, state])
+        out[:, TreeState.DEAD] = cells - out[:, 1:].sum(axis=1)
+        return out
+
+    def run(self, generations):
+        """
+        Step every forest for a number of generations.
+
+        :return: int64 array shaped (generations, batch, 4) with the state counts
+            after each generation, indexed by TreeState.
+        """
+        history = np.empty((generations, len(self.prngs), len(TreeState)), dtype=np.int64)
+        for generation in range(generations):
+            self.cycle()
+            self.counts(out=history[generation])
+        return history
 
-        for i in range(height):
-            for j in range(width):
-                if self.forest[i, j] == 1:
-                    image_data[i, j] = alive 
-                elif self.forest[i, j] == 2:
-                    image_data[i, j] = burning 
-                elif self.forest[i, j] == 3:
-                    image_data[i, j] = oldGrowth 
-                else:
-                    image_data[i, j] = dead
-
-        # Create and save the image
-        image = Image.fromarray(image_data, 'RGB')
-        assert image_data.shape == (self.forest.shape[0], self.forest.shape[1], 3), "Image dimensions mismatch!"
-        return image
 
 # Main function
 if __name__ == "__main__":
-    # Instantiate the class with your desired parameters
-    probabilities = {
-        'BasicTree' : {
-            'GrowthSpreadRate'  : 0.02,
-            'NaturalDeathRate'  : 0.01,
-            'LightningRate'     : 0.00001,      # 0.0000001
-            'FireSpreadRate'    : 0.9,
-            'FireDeathRate'     : 0.1,
-            'FireExtinguishRate': 0.1
-        },
-        'OldGrowth' : {
-            'GrowthSpreadRate'  : 0.001,
-            'NaturalDeathRate'  : 0.0005,
-            'LightningRate'     : 0.0000005,    # 0.000005
-            'FireSpreadRate'    : 0.3,   # 0.03 # Resistance to burning
-            'FireDeathRate'     : 0.001,
-            'FireExtinguishRate': 0.01
-        }
-    }
-
+    profiler.configureFromEnvironment()
     run_fire = ForestFire(
         timestep=0.01,
         density=0.00025,
-        probs=probabilities
+        probs=DEFAULT_PROBABILITIES
     )
     run_fire.run()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# Overlap ForestFire simulation with panel output: a simulation worker fills a
+# ring of preallocated uint8 frames while the main thread shows them.
+from multiprocessing import shared_memory
+import multiprocessing
+import signal
+import threading
+import numpy as np
+
+from forestFire import ForestFire, DEFAULT_PROBABILITIES
+from matrixConfig import getMatrix
+from deltaDisplay import DeltaDisplay
+from frameScheduler import FrameScheduler
+
+
+class FrameRing():
+    def __init__(self, slots, shape, shared=False, name=None):
+        """
+        Bounded single-producer / single-consumer ring of preallocated uint8 frames.
+
+        The producer blocks while every slot is full, which is the backpressure that
+        keeps the simulation from running ahead of the display.
+
+        :param slots: Number of frames in the ring.
+        :param shape: (height, width) of a frame.
+        :param shared: Back the frames with shared memory so another process can fill them.
+        :param name: Attach to an existing shared ring instead of creating one (used by the worker).
+        """
+        self.slots = slots
+        self.shape = tuple(shape)
+        frameBytes = int(np.prod(self.shape))
+        nbytes = slots * frameBytes + slots * 8   # frames followed by one int64 generation per slot
+
+        self.shm = None
+        if shared:
+            self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=nbytes)
+            buffer = self.shm.buf
+            context = multiprocessing
+        else:
+            buffer = bytearray(nbytes)
+            context = threading
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=buffer)
+        self.generations = np.ndarray((slots,), dtype=np.int64, buffer=buffer, offset=slots * frameBytes)
+
+        if name is None:
+            self.free = context.Semaphore(slots)
+            self.filled = context.Semaphore(0)
+        self.writeIndex = 0
+        self.readIndex = 0
+
+    def spec(self):
+        """What a worker process needs to attach to this ring"""
+        return {'slots': self.slots, 'shape': self.shape, 'name': self.shm.name,
+                'free': self.free, 'filled': self.filled}
+
+    @classmethod
+    def attach(cls, spec):
+        ring = cls(spec['slots'], spec['shape'], shared=True, name=spec['name'])
+        ring.free = spec['free']
+        ring.filled = spec['filled']
+        return ring
+
+    def put(self, frame, generation, stop, timeout=0.1):
+        """Copy a frame into the next free slot, waiting while the ring is full. False if stopped."""
+        while not self.free.acquire(timeout=timeout):
+            if stop.is_set():
+                return False
+        slot = self.writeIndex
+        np.copyto(self.frames[slot], frame)
+        self.generations[slot] = generation
+        self.writeIndex = (slot + 1) % self.slots
+        self.filled.release()
+        return True
+
+    def get(self, timeout=0.1):
+        """
+        Oldest filled slot as (frame, generation), or None if nothing arrived in time
+        (timeout 0 only checks).
+        The frame is a view into the ring, hand it back with release() once shown.
+        """
+        if not self.filled.acquire(timeout=timeout):
+            return None
+        slot = self.readIndex
+        return self.frames[slot], int(self.generations[slot])
+
+    def release(self):
+        """Give the slot returned by the last get() back to the producer"""
+        self.readIndex = (self.readIndex + 1) % self.slots
+        self.free.release()
+
+    def close(self):
+        if self.shm is not None:
+            self.frames = self.generations = None
+            self.shm.close()
+
+    def unlink(self):
+        if self.shm is not None:
+            self.shm.unlink()
+
+
+def simulate(forest, ring, stop):
+    """Producer loop: cycle the forest and publish every generation to the ring"""
+    generation = 0
+    while not stop.is_set():
+        forest.cycle()
+        generation += 1
+        if not ring.put(forest.forest, generation, stop):
+            break
+
+
+def simulateProcess(forest, spec, stop):
+    """Producer entry point for a worker process, leaves Ctrl+C to the parent"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = FrameRing.attach(spec)
+    try:
+        simulate(forest, ring, stop)
+    finally:
+        ring.close()
+
+
+class PipelinedRunner():
+    def __init__(self, forest, mode='thread', slots=4):
+        """
+        Run a ForestFire with the simulation on a worker and the output on the caller.
+
+        :param forest: ForestFire instance to simulate.
+        :param mode: 'thread' to simulate on a thread (NumPy releases the GIL for the
+            grid passes), or 'process' to simulate in another process writing to shared memory.
+        :param slots: Frames buffered between the two stages.
+        """
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"mode must be 'thread' or 'process', got {mode!r}")
+        self.forest = forest
+        self.mode = mode
+        self.ring = FrameRing(slots, forest.forest.shape, shared=mode == 'process')
+        if mode == 'process':
+            self.stopEvent = multiprocessing.Event()
+            self.worker = multiprocessing.Process(
+                target=simulateProcess, args=(forest, self.ring.spec(), self.stopEvent), daemon=True)
+        else:
+            self.stopEvent = threading.Event()
+            self.worker = threading.Thread(
+                target=simulate, args=(forest, self.ring, self.stopEvent), daemon=True)
+
+    def run(self, display_fps=None, show=None, frames=None):
+        """
+        Show generations as they are produced until Ctrl+C or frames have been shown.
+
+        :param display_fps: Frames shown per second, defaults to 1 / forest.timestep.
+        :param show: Called as show(frame, generation) for every frame, defaults to
+            pushing the frame to the panel.
+        :param frames: Number of frames to show, None for forever.
+        """
+        if show is None:
+            display = DeltaDisplay(getMatrix(), self.forest.palette)
+            def show(frame, generation):
+                display.show(frame)
+
+        fps = display_fps or (1 / self.forest.timestep if self.forest.timestep > 0 else None)
+        # On a schedule a missing frame just skips this step, waiting would eat into
+        # the next ones; unscheduled there is nothing else to do but wait
+        wait = 0 if fps else 0.1
+        self.shown = 0
+
+        def step():
+            if frames is not None and self.shown >= frames:
+                return      # stopped, the scheduler finishes its batch of steps
+            item = self.ring.get(timeout=wait)
+            if item is None:
+                return
+            show(*item)
+            self.ring.release()
+            self.shown += 1
+            if frames is not None and self.shown >= frames:
+                self.scheduler.stop()
+
+        self.scheduler = FrameScheduler(sim_rate=fps)
+        self.worker.start()
+        try:
+            self.scheduler.run(step)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop the worker (it polls the stop flag while waiting on a full ring) and free the ring"""
+        self.stopEvent.set()
+        self.worker.join(timeout=5)
+        self.ring.close()
+        self.ring.unlink()
+
+
+# Main function
+if __name__ == "__main__":
+    run_fire = ForestFire(
+        timestep=0.01,
+        density=0.00025,
+        probs=DEFAULT_PROBABILITIES
+    )
+    PipelinedRunner(run_fire, mode='process').run()
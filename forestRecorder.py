@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# Record ForestFire generations to disk and replay them without simulating.
+#
+# A recording is three files next to each other:
+#   <path>        frame payloads appended one after another
+#   <path>.idx    one INDEX_DTYPE record per generation (offset, length, kind)
+#   <path>.json   grid shape, encoding mode and keyframe interval
+import json
+import os
+import numpy as np
+
+from frameScheduler import FrameScheduler
+
+
+# Payload kinds stored in the index
+RAW, DELTA, RLE = 0, 1, 2
+MODES = {'raw': RAW, 'delta': DELTA, 'rle': RLE}
+INDEX_DTYPE = np.dtype([('offset', '<i8'), ('length', '<i4'), ('kind', 'u1')])
+
+
+def encodeRle(frame):
+    """Run-length encode a flat uint8 frame as uint32 run lengths followed by the run values"""
+    flat = frame.reshape(-1)
+    starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+    lengths = np.diff(np.append(starts, flat.size)).astype('<u4')
+    return lengths.tobytes() + flat[starts].tobytes()
+
+
+def decodeRle(payload, out):
+    runs = len(payload) // 5
+    lengths = np.frombuffer(payload, dtype='<u4', count=runs)
+    values = np.frombuffer(payload, dtype=np.uint8, offset=4 * runs, count=runs)
+    out.reshape(-1)[:] = np.repeat(values, lengths)
+    return out
+
+
+def encodeDelta(frame, previous):
+    """Changed cells as uint32 flat positions followed by their new values"""
+    changed = np.flatnonzero(frame != previous).astype('<u4')
+    return changed.tobytes() + frame.reshape(-1)[changed].tobytes()
+
+
+def decodeDelta(payload, out):
+    """Apply a delta payload on top of the previous frame held in out"""
+    changes = len(payload) // 5
+    positions = np.frombuffer(payload, dtype='<u4', count=changes)
+    values = np.frombuffer(payload, dtype=np.uint8, offset=4 * changes, count=changes)
+    out.reshape(-1)[positions] = values
+    return out
+
+
+def readIndex(path):
+    """Complete index records of a recording, ignoring a partly written last one"""
+    count = os.path.getsize(path + '.idx') // INDEX_DTYPE.itemsize
+    return np.fromfile(path + '.idx', dtype=INDEX_DTYPE, count=count)
+
+
+class GenerationRecorder():
+    def __init__(self, path, shape, mode='delta', keyframe_every=256, flush=True):
+        """
+        Append uint8 state grids to a recording, reopening and continuing an existing one.
+
+        :param path: Recording file, the index and header are written next to it.
+        :param shape: (height, width) of the grid.
+        :param mode: 'raw' full frames, 'delta' changed cells since the previous frame
+            with a full keyframe every keyframe_every frames, or 'rle' run-length frames.
+        :param flush: Flush after every frame so a power cut loses at most one generation.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {tuple(MODES)}, got {mode!r}")
+        self.path = path
+        self.shape = tuple(shape)
+        self.mode = mode
+        self.keyframe_every = keyframe_every
+        self.flush = flush
+        self.previous = np.zeros(self.shape, dtype=np.uint8)
+
+        header = {'shape': list(self.shape), 'mode': mode, 'keyframe_every': keyframe_every}
+        if os.path.exists(path + '.json'):
+            with open(path + '.json') as f:
+                existing = json.load(f)
+            if existing != header:
+                raise ValueError(f"{path} was recorded with {existing}, not {header}")
+            # The index may have reached the disk while the data tail did not (no fsync),
+            # keep only records whose frame is complete, then drop anything after them
+            index = readIndex(path)
+            index = index[:np.searchsorted(index['offset'] + index['length'], os.path.getsize(path), side='right')]
+            self.cut(index)
+        else:
+            with open(path + '.json', 'w') as f:
+                json.dump(header, f)
+            open(path, 'wb').close()
+            open(path + '.idx', 'wb').close()
+            self.count = 0
+            self.offset = 0
+
+        self.data = open(path, 'ab')
+        self.index = open(path + '.idx', 'ab')
+
+    def cut(self, index):
+        """Shorten the files to the frames in index, a prefix of the records on disk"""
+        self.offset = int(index['offset'][-1] + index['length'][-1]) if len(index) else 0
+        os.truncate(self.path, self.offset)
+        os.truncate(self.path + '.idx', len(index) * INDEX_DTYPE.itemsize)
+        self.count = len(index)
+        self.previous.fill(0)
+        if self.count:
+            with GenerationReader(self.path) as reader:
+                np.copyto(self.previous, reader[self.count - 1])
+
+    def truncate(self, count):
+        """
+        Drop every generation after the first count, e.g. to rewind the recording to
+        a restored checkpoint. Appending continues from there.
+        """
+        if not 0 <= count <= self.count:
+            raise ValueError(f"can't truncate a recording of {self.count} generations to {count}")
+        self.data.flush()
+        self.index.flush()
+        self.cut(readIndex(self.path)[:count])
+
+    def append(self, frame):
+        """Add the next generation"""
+        if self.mode == 'rle':
+            kind, payload = RLE, encodeRle(frame)
+        elif self.mode == 'delta' and self.count % self.keyframe_every:
+            kind, payload = DELTA, encodeDelta(frame, self.previous)
+        else:
+            kind, payload = RAW, np.ascontiguousarray(frame, dtype=np.uint8).tobytes()
+
+        self.data.write(payload)
+        record = np.array([(self.offset, len(payload), kind)], dtype=INDEX_DTYPE)
+        self.index.write(record.tobytes())
+        if self.flush:
+            self.data.flush()
+            self.index.flush()
+        self.offset += len(payload)
+        self.count += 1
+        np.copyto(self.previous, frame)
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GenerationReader():
+    def __init__(self, path):
+        """
+        Random access to a recording through a memory map of the frame file.
+
+        Reading generations in order only decodes each delta once; jumping
+        backwards or ahead replays from the nearest earlier keyframe.
+        """
+        with open(path + '.json') as f:
+            header = json.load(f)
+        self.shape = tuple(header['shape'])
+        self.mode = header['mode']
+        self.index = readIndex(path)
+        self.data = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) else np.zeros(0, np.uint8)
+        self.frame = np.zeros(self.shape, dtype=np.uint8)
+        self.current = -1     # generation held in self.frame
+
+    def __len__(self):
+        return len(self.index)
+
+    def payload(self, generation):
+        offset, length, kind = self.index[generation]
+        return kind, self.data[offset:offset + length]
+
+    def __getitem__(self, generation):
+        """
+        The grid at a generation (0-based position in the recording). The returned
+        array is reused by the next lookup, copy it to keep it.
+        """
+        if generation < 0:
+            generation += len(self)
+        if not 0 <= generation < len(self):
+            raise IndexError(f"generation {generation} not in recording of {len(self)}")
+
+        if generation == self.current:
+            return self.frame
+        if generation < self.current:
+            self.current = -1
+        start = generation
+        while self.current < start and self.index['kind'][start] == DELTA:
+            start -= 1          # walk back to a keyframe or to the frame already decoded
+        if start > self.current:
+            kind, payload = self.payload(start)
+            if kind == RLE:
+                decodeRle(payload, self.frame)
+            else:
+                self.frame.reshape(-1)[:] = payload
+            self.current = start
+
+        for g in range(self.current + 1, generation + 1):
+            kind, payload = self.payload(g)
+            decodeDelta(payload, self.frame)
+        self.current = generation
+        return self.frame
+
+    def close(self):
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replay(reader, show, fps=30, start=0, stop=None):
+    """
+    Play a recording back at any speed with no simulation cost.
+
+    :param reader: GenerationReader to play.
+    :param show: Called with each grid, e.g. DeltaDisplay(matrix, palette).show.
+    :param fps: Generations shown per second.
+    :param start: First generation to show.
+    :param stop: Generation to stop before, defaults to the end of the recording.
+    """
+    generations = iter(range(start, len(reader) if stop is None else stop))
+    scheduler = FrameScheduler(sim_rate=fps)
+
+    def step():
+        generation = next(generations, None)
+        if generation is None:
+            scheduler.stop()
+        else:
+            show(reader[generation])
+
+    scheduler.run(step)
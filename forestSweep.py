@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# Sweep the ForestFire probabilities over a grid of rates on a process pool.
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import copy
+import hashlib
+import itertools
+import json
+import os
+import numpy as np
+
+from forestFire import ForestFireBatch, TreeState, DEFAULT_PROBABILITIES
+
+
+def expandGrid(base_probs, ranges):
+    """
+    Build every combination of the swept rates on top of a base probabilities dict.
+
+    :param base_probs: Probabilities dict as used by ForestFire, e.g. the one in forestFire.py's __main__.
+    :param ranges: Maps 'TreeName.RateName' (e.g. 'BasicTree.LightningRate') to a list of values.
+    :return: List of full probabilities dicts, one per combination.
+    """
+    keys = list(ranges)
+    for key in keys:
+        treeName, rateName = key.split('.')
+        if rateName not in base_probs[treeName]:
+            raise KeyError(f"unknown rate {key!r}")
+
+    configs = []
+    for values in itertools.product(*(ranges[key] for key in keys)):
+        probs = copy.deepcopy(base_probs)
+        for key, value in zip(keys, values):
+            treeName, rateName = key.split('.')
+            probs[treeName][rateName] = float(value)
+        configs.append(probs)
+    return configs
+
+
+def configHash(config):
+    """Stable hash of everything that determines the outcome of a task"""
+    text = json.dumps(config, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def taskSeeds(seed, key, replicates):
+    """
+    Seeds for a task's replicates, derived from the sweep seed and the config hash
+    so they do not depend on the order or the number of tasks in the sweep.
+    """
+    sequence = np.random.SeedSequence([seed, int(key[:16], 16)])
+    return [int(s) for s in sequence.generate_state(replicates, dtype=np.uint32)]
+
+
+def summarize(history):
+    """
+    Summary metrics for a (generations, replicates, 4) history of state counts.
+
+    meanFireFraction:   mean fraction of cells on fire over all generations and replicates
+    extinctionRate:     fraction of replicates where every tree died out
+    timeToExtinction:   mean generation at which those replicates died out, None if none did
+    oldGrowthSurvival:  fraction of replicates still holding old growth at the end
+    """
+    cells = history[0, 0].sum()
+    fire = history[:, :, TreeState.BURNING] / cells
+    living = history[:, :, TreeState.ALIVE] + history[:, :, TreeState.OLD_GROWTH] + history[:, :, TreeState.BURNING]
+    extinct = living == 0
+    wentExtinct = extinct.any(axis=0)
+    firstExtinct = extinct.argmax(axis=0) + 1
+
+    return {
+        'meanFireFraction'  : float(fire.mean()),
+        'extinctionRate'    : float(wentExtinct.mean()),
+        'timeToExtinction'  : float(firstExtinct[wentExtinct].mean()) if wentExtinct.any() else None,
+        'oldGrowthSurvival' : float((history[-1, :, TreeState.OLD_GROWTH] > 0).mean()),
+    }
+
+
+def runTask(task):
+    """Run one configuration's replicates in a worker process and summarize them"""
+    config = task['config']
+    batch = ForestFireBatch(
+        probs=config['probs'],
+        seeds=task['seeds'],
+        density=config['density'],
+        width=config['width'],
+        height=config['height'])
+    history = batch.run(config['generations'])
+    return dict(key=task['key'], config=config, **summarize(history))
+
+
+def loadFinished(results_path):
+    """Config hashes already present in a results file"""
+    finished = set()
+    if os.path.exists(results_path):
+        with open(results_path) as results:
+            for line in results:
+                try:
+                    finished.add(json.loads(line)['key'])
+                except (ValueError, KeyError):
+                    pass  # partially written last line from an interrupted run
+    return finished
+
+
+def sweep(base_probs, ranges, results_path, seed=1000, replicates=8, generations=1000,
+          density=0.00025, width=128, height=32, workers=None):
+    """
+    Run every configuration in the grid and append one JSON line per configuration
+    to results_path as soon as it finishes.
+
+    Configurations whose hash is already in results_path are skipped, so an
+    interrupted sweep picks up where it stopped.
+
+    :param base_probs: Probabilities dict the ranges are applied to.
+    :param ranges: Maps 'TreeName.RateName' to the values to try.
+    :param seed: Sweep seed, every task's replicate seeds are derived from it.
+    :param replicates: Independent forests per configuration.
+    :param generations: Cycles per forest.
+    :param workers: Process count, defaults to the CPU count.
+    :return: Number of configurations run by this call.
+    """
+    finished = loadFinished(results_path)
+    tasks = []
+    for probs in expandGrid(base_probs, ranges):
+        config = {
+            'probs'       : probs,
+            'seed'        : seed,
+            'replicates'  : replicates,
+            'generations' : generations,
+            'density'     : density,
+            'width'       : width,
+            'height'      : height,
+        }
+        key = configHash(config)
+        if key in finished:
+            continue
+        finished.add(key)   # also drops duplicate points within this grid
+        tasks.append({'key': key, 'config': config, 'seeds': taskSeeds(seed, key, replicates)})
+
+    print(f"{len(tasks)} configurations to run, {len(finished) - len(tasks)} already done")
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(results_path, 'a') as results:
+        futures = [pool.submit(runTask, task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            results.write(json.dumps(future.result()) + "\n")
+            results.flush()
+            print(f"\r{done}/{len(tasks)} configurations", end="")
+    print()
+    return len(tasks)
+
+
+# Main function
+if __name__ == "__main__":
+    sweep(
+        DEFAULT_PROBABILITIES,
+        ranges={
+            'BasicTree.LightningRate'   : [0.000001, 0.00001, 0.0001],
+            'BasicTree.GrowthSpreadRate': [0.01, 0.02, 0.05],
+            'OldGrowth.FireSpreadRate'  : [0.03, 0.3],
+        },
+        results_path='sweep_results.jsonl',
+        generations=2000,
+    )
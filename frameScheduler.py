@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# Fixed-timestep loop driving a simulation step and a display refresh at separate rates.
+import time
+
+
+class FrameScheduler():
+    def __init__(self, sim_rate, display_fps=None, max_steps_per_frame=4, clock=time.perf_counter, sleep=time.sleep):
+        """
+        Call a step function at a fixed rate and a render function at its own rate,
+        sleeping only for whatever time is left over.
+
+        Time already spent in step/render is deducted from the wait, so the rates do
+        not drift when a step is slow. When the loop falls behind it catches up with
+        at most max_steps_per_frame steps between renders and drops the rest, and
+        render calls that are overdue are skipped instead of queued.
+
+        :param sim_rate: Simulation steps per second, None to step as fast as possible.
+        :param display_fps: Renders per second, None to render after every batch of steps.
+        :param max_steps_per_frame: Catch-up limit before simulation steps are dropped.
+        :param clock: Monotonic clock in seconds, replaceable for testing.
+        :param sleep: Sleep function, replaceable for testing.
+        """
+        self.step_dt = 1.0 / sim_rate if sim_rate else 0.0
+        self.frame_dt = 1.0 / display_fps if display_fps else 0.0
+        self.max_steps_per_frame = max_steps_per_frame
+        self.clock = clock
+        self.sleep = sleep
+        self.running = False
+
+        self.steps = 0
+        self.frames = 0
+        self.droppedSteps = 0
+        self.droppedFrames = 0
+        self.start = None
+        self.window = None
+
+    def stop(self):
+        """Make run() return after the current iteration"""
+        self.running = False
+
+    def run(self, step, render=None, steps=None):
+        """
+        Drive step() and render() until stop() is called or steps have been taken.
+
+        :param step: Advances the simulation by one fixed step.
+        :param render: Draws the current state, optional.
+        :param steps: Number of simulation steps to run, None for forever.
+        """
+        self.running = True
+        now = self.clock()
+        self.start = now
+        self.window = (now, self.steps, self.frames)
+        next_step = now
+        next_frame = now
+
+        while self.running and (steps is None or self.steps < steps):
+            # Simulation: take every step that is due, up to the catch-up limit
+            taken = 0
+            while self.clock() >= next_step and taken < self.max_steps_per_frame:
+                step()
+                self.steps += 1
+                taken += 1
+                next_step += self.step_dt
+                if steps is not None and self.steps >= steps:
+                    break
+            now = self.clock()
+            if self.step_dt and now - next_step > self.step_dt:
+                # too far behind, give up on the missed steps rather than spiral
+                missed = int((now - next_step) / self.step_dt)
+                self.droppedSteps += missed
+                next_step += missed * self.step_dt
+
+            # Display: render once if a frame is due, skip the ones already missed
+            if render is not None and (taken or self.frame_dt) and now >= next_frame:
+                render()
+                self.frames += 1
+                next_frame += self.frame_dt
+                now = self.clock()
+                if self.frame_dt and now > next_frame:
+                    missed = int((now - next_frame) / self.frame_dt) + 1
+                    self.droppedFrames += missed
+                    next_frame += missed * self.frame_dt
+
+            # Sleep until the next thing is due
+            wake = next_step if not self.frame_dt or render is None else min(next_step, next_frame)
+            delay = wake - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+
+    def rates(self):
+        """
+        Measured rates since the previous call (or since run() started).
+
+        :return: dict with simRate and displayRate in Hz, plus the running totals
+            of steps, frames, droppedSteps and droppedFrames.
+        """
+        now = self.clock()
+        since, steps, frames = self.window or (now, self.steps, self.frames)
+        elapsed = now - since
+        self.window = (now, self.steps, self.frames)
+        return {
+            'simRate'       : (self.steps - steps) / elapsed if elapsed > 0 else 0.0,
+            'displayRate'   : (self.frames - frames) / elapsed if elapsed > 0 else 0.0,
+            'steps'         : self.steps,
+            'frames'        : self.frames,
+            'droppedSteps'  : self.droppedSteps,
+            'droppedFrames' : self.droppedFrames,
+        }
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# Stream ForestFire state grids over TCP: simulate on a fast machine, show on the Pi.
+#
+#   python frameTransport.py receive                          on the Pi, drives the panel
+#   python frameTransport.py send <pi-host> --width 128       anywhere, runs the simulation
+#
+# Every message is a HEADER followed by its payload. The sender starts with a
+# PALETTE message, then sends each generation as a full grid, as the cells that
+# changed since the last frame it sent (forestRecorder's delta encoding), or
+# zlib-compressed. The receiver decodes every frame but only shows the newest,
+# frames that were overtaken or arrive too late are counted and skipped.
+import argparse
+import select
+import socket
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+
+from forestRecorder import RAW, DELTA, RLE, encodeDelta, decodeDelta, decodeRle
+from deltaDisplay import DeltaDisplay
+from profiling import Histogram
+
+
+PORT = 7755
+MAGIC = b'FFT1'
+PALETTE = 8                 # message kind carrying the (states, 3) palette
+COMPRESSED = 1              # flag: payload is zlib compressed
+MODES = ('raw', 'delta', 'zlib')
+
+# magic, kind, flags, height, width, sequence, send time (time.time()), payload length
+HEADER = struct.Struct('<4sBBHHIdI')
+
+
+class FrameSender():
+    def __init__(self, host, port=PORT, mode='zlib', keyframe_every=64, level=1, drop_when_busy=True):
+        """
+        Send uint8 state grids to a FrameReceiver.
+
+        :param mode: 'raw' full grids, 'delta' changed cells since the last frame sent
+            with a full grid every keyframe_every frames, or 'zlib' the same compressed.
+        :param level: zlib compression level.
+        :param drop_when_busy: Skip a frame instead of waiting when the socket can't take
+            more, so a slow link or receiver does not slow the simulation down. Deltas
+            are taken against the last frame actually sent, so skipping is safe.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        self.address = (host, port)
+        self.mode = mode
+        self.keyframe_every = keyframe_every
+        self.level = level
+        self.drop_when_busy = drop_when_busy
+        self.sock = None
+        self.previous = None
+        self.sinceKeyframe = 0
+        self.sequence = 0
+        self.framesSent = 0
+        self.framesSkipped = 0
+        self.bytesSent = 0
+        self.rawBytes = 0
+
+    def connect(self, timeout=10):
+        self.sock = socket.create_connection(self.address, timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(None)
+        return self
+
+    def message(self, kind, payload, height=0, width=0, flags=0, sequence=0):
+        if self.mode == 'zlib' and kind != PALETTE:
+            payload = zlib.compress(payload, self.level)
+            flags |= COMPRESSED
+        header = HEADER.pack(MAGIC, kind, flags, height, width, sequence, time.time(), len(payload))
+        self.sock.sendall(header + payload)
+        self.bytesSent += HEADER.size + len(payload)
+
+    def sendPalette(self, palette):
+        """Tell the receiver which colour each state is drawn in"""
+        palette = np.ascontiguousarray(palette, dtype=np.uint8)
+        self.message(PALETTE, palette.tobytes(), *palette.shape)
+
+    def send(self, frame):
+        """
+        Send the next generation. Returns False if it was skipped because the socket was busy.
+        Every call uses up a sequence number, so the receiver can tell how many were skipped.
+        """
+        self.sequence += 1
+        if self.drop_when_busy and self.previous is not None:
+            _, writable, _ = select.select([], [self.sock], [], 0)
+            if not writable:
+                self.framesSkipped += 1
+                return False
+
+        height, width = frame.shape
+        kind = RAW
+        if self.mode != 'raw' and self.previous is not None and self.sinceKeyframe < self.keyframe_every:
+            payload = encodeDelta(frame, self.previous)
+            kind = DELTA
+            if len(payload) >= frame.size:     # most cells changed, a full grid is smaller
+                kind = RAW
+        if kind == RAW:
+            payload = np.ascontiguousarray(frame, dtype=np.uint8).tobytes()
+            self.sinceKeyframe = 0
+        else:
+            self.sinceKeyframe += 1
+
+        self.message(kind, payload, height, width, sequence=self.sequence)
+        if self.previous is None or self.previous.shape != frame.shape:
+            self.previous = np.empty_like(frame)
+        np.copyto(self.previous, frame)
+        self.framesSent += 1
+        self.rawBytes += frame.size
+        return True
+
+    def stats(self):
+        return {
+            'framesSent'    : self.framesSent,
+            'framesSkipped' : self.framesSkipped,
+            'bytesSent'     : self.bytesSent,
+            'compression'   : self.rawBytes / max(self.bytesSent, 1),
+        }
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class FrameReceiver():
+    def __init__(self, matrix=None, host='0.0.0.0', port=PORT, max_latency=0.25, palette=None):
+        """
+        Receive frames from a FrameSender and push them to the matrix.
+
+        :param matrix: RGBMatrix to draw on, defaults to matrixConfig.getMatrix().
+        :param port: TCP port to listen on, 0 picks a free one (see self.port).
+        :param max_latency: Frames older than this many seconds (above the lowest
+            latency seen, which absorbs a clock offset between the two machines) are
+            decoded but not shown.
+        :param palette: Palette to use until the sender sends one.
+        """
+        if matrix is None:
+            from matrixConfig import getMatrix
+            matrix = getMatrix()
+        self.matrix = matrix
+        self.max_latency = max_latency
+        self.display = None
+        self.palette = None if palette is None else np.ascontiguousarray(palette, dtype=np.uint8)
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.sock = None
+        self.buffer = bytearray()
+        self.grid = None
+        self.stopEvent = threading.Event()
+        self.reset()
+
+    def reset(self):
+        """Start the counters, sequence and latency baseline over for a new sender"""
+        self.buffer.clear()
+        self.fresh = False          # grid holds a frame that is due to be shown
+        self.pending = False        # grid holds a frame that has not been shown, late or not
+        self.framesReceived = 0
+        self.framesShown = 0
+        self.framesOvertaken = 0    # decoded, but a newer frame arrived before it was shown
+        self.framesLate = 0
+        self.framesMissing = 0      # sequence numbers the sender skipped
+        self.bytesReceived = 0
+        self.lastSequence = 0
+        self.baseLatency = None     # lowest send to receive time seen, includes the clock offset
+        self.latency = Histogram()  # latency above baseLatency
+        self.started = time.perf_counter()
+
+    def accept(self, timeout=None):
+        """Wait for a sender to connect, returns False on timeout"""
+        self.server.settimeout(timeout)
+        try:
+            self.sock, _ = self.server.accept()
+        except socket.timeout:
+            return False
+        self.sock.settimeout(None)
+        self.reset()
+        return True
+
+    def messages(self, timeout):
+        """
+        Read whatever arrives within timeout and yield the complete messages. Raises
+        ConnectionError once the sender has closed and its last messages are yielded.
+        """
+        closed = False
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        while ready:
+            chunk = self.sock.recv(1 << 20)
+            if not chunk:
+                closed = True
+                break
+            self.buffer += chunk
+            self.bytesReceived += len(chunk)
+            ready, _, _ = select.select([self.sock], [], [], 0)
+
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            header = HEADER.unpack_from(self.buffer, offset)
+            if header[0] != MAGIC:
+                raise ValueError(f"bad frame header {bytes(header[0])!r}")
+            end = offset + HEADER.size + header[-1]
+            if len(self.buffer) < end:
+                break
+            yield header, bytes(self.buffer[offset + HEADER.size:end])
+            offset = end
+        del self.buffer[:offset]
+        if closed:
+            raise ConnectionError("sender closed the connection")
+
+    def receive(self, header, payload):
+        """Apply one message to the grid"""
+        _, kind, flags, height, width, sequence, sent, _ = header
+        if flags & COMPRESSED:
+            payload = zlib.decompress(payload)
+        if kind == PALETTE:
+            self.palette = np.frombuffer(payload, dtype=np.uint8).reshape(height, width).copy()
+            if self.display is not None:
+                self.display.setPalette(self.palette)
+            return
+
+        if self.grid is None or self.grid.shape != (height, width):
+            self.grid = np.zeros((height, width), dtype=np.uint8)
+        if kind == RAW:
+            np.copyto(self.grid, np.frombuffer(payload, dtype=np.uint8).reshape(height, width))
+        elif kind == DELTA:
+            decodeDelta(payload, self.grid)
+        elif kind == RLE:
+            decodeRle(payload, self.grid)
+        else:
+            raise ValueError(f"unknown frame kind {kind}")
+
+        self.framesReceived += 1
+        if self.lastSequence and sequence > self.lastSequence + 1:
+            self.framesMissing += sequence - self.lastSequence - 1
+        self.lastSequence = sequence
+        if self.fresh:
+            self.framesOvertaken += 1
+
+        # Negative when the sender's clock is ahead, the baseline takes the offset out
+        latency = time.time() - sent
+        if self.baseLatency is None or latency < self.baseLatency:
+            self.baseLatency = latency
+        self.latency.record(latency - self.baseLatency)
+        late = latency - self.baseLatency > self.max_latency
+        self.framesLate += late
+        self.fresh = not late
+        self.pending = True
+
+    def poll(self, timeout=0.1):
+        """
+        Take in everything that arrived, returns True if there is a new frame to show.
+        A late frame is still shown once nothing newer arrives, so the panel ends up
+        on the sender's last frame.
+        """
+        arrived = False
+        for header, payload in self.messages(timeout):
+            self.receive(header, payload)
+            arrived = True
+        return self.fresh or (self.pending and not arrived)
+
+    def show(self):
+        """Push the newest frame to the matrix"""
+        if self.display is None:
+            if self.palette is None:
+                raise ValueError("no palette received or given")
+            self.display = DeltaDisplay(self.matrix, self.palette)
+        self.display.show(self.grid)
+        self.framesShown += 1
+        self.fresh = self.pending = False
+
+    def run(self, frames=None, timeout=None):
+        """
+        Accept a sender and show its frames as they come, until it disconnects, stop()
+        is called or frames have been shown.
+
+        :param timeout: Seconds to wait for a sender, None for forever.
+        """
+        if self.sock is None and not self.accept(timeout):
+            return
+        try:
+            while not self.stopEvent.is_set() and (frames is None or self.framesShown < frames):
+                if self.poll(timeout=0.1):
+                    self.show()
+        except ConnectionError:
+            if self.pending:
+                self.show()     # the sender's last frame
+
+    def stop(self):
+        self.stopEvent.set()
+
+    def stats(self):
+        """
+        Counters since the sender connected, in ms. The latency figures are above
+        baseLatencyMs, the lowest seen, which also holds any clock offset.
+        """
+        elapsed = time.perf_counter() - self.started
+        h = self.latency
+        return {
+            'framesReceived'  : self.framesReceived,
+            'framesShown'     : self.framesShown,
+            'framesOvertaken' : self.framesOvertaken,
+            'framesLate'      : self.framesLate,
+            'framesMissing'   : self.framesMissing,
+            'bytesReceived'   : self.bytesReceived,
+            'receivedFps'     : self.framesReceived / elapsed if elapsed else 0.0,
+            'shownFps'        : self.framesShown / elapsed if elapsed else 0.0,
+            'mbps'            : self.bytesReceived * 8 / 1e6 / elapsed if elapsed else 0.0,
+            'baseLatencyMs'   : (self.baseLatency or 0.0) * 1000,
+            'latencyMeanMs'   : h.total / h.count * 1000 if h.count else 0.0,
+            'latencyP99Ms'    : h.percentile(99) * 1000,
+            'latencyMaxMs'    : h.max * 1000,
+        }
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.server.close()
+
+
+def streamForest(forest, sender, generations=None):
+    """
+    Cycle a ForestFire at 1 / timestep generations per second and send every generation.
+
+    :param generations: Number of generations, None for forever.
+    """
+    from frameScheduler import FrameScheduler
+    sender.sendPalette(forest.palette)
+
+    def step():
+        forest.cycle()
+        sender.send(forest.forest)
+
+    FrameScheduler(sim_rate=1 / forest.timestep if forest.timestep > 0 else None).run(step, steps=generations)
+
+
+# Main function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream ForestFire frames to a panel over TCP")
+    parser.add_argument('role', choices=('send', 'receive'))
+    parser.add_argument('host', nargs='?', default='127.0.0.1', help="receiver to send to")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--mode', choices=MODES, default='zlib')
+    parser.add_argument('--width', type=int, default=None)
+    parser.add_argument('--height', type=int, default=None)
+    parser.add_argument('--timestep', type=float, default=0.01)
+    parser.add_argument('--max-latency', type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.role == 'receive':
+        receiver = FrameReceiver(port=args.port, max_latency=args.max_latency)
+        print(f"waiting for a sender on port {receiver.port}")
+        try:
+            while True:
+                receiver.run()
+                print(receiver.stats())
+                receiver.sock.close()
+                receiver.sock = None
+        except KeyboardInterrupt:
+            pass
+        finally:
+            receiver.close()
+    else:
+        from forestFire import ForestFire, DEFAULT_PROBABILITIES
+        forest = ForestFire(timestep=args.timestep, density=0.00025, probs=DEFAULT_PROBABILITIES,
+                            width=args.width, height=args.height)
+        sender = FrameSender(args.host, args.port, mode=args.mode).connect()
+        try:
+            streamForest(forest, sender)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(sender.stats())
+            sender.close()
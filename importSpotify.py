@@ -1,64 +1,152 @@
 
-import json 
-import spotipy 
+import json
+import spotipy
+import requests
 import webbrowser
+import time
 
 from dotenv import load_dotenv
 import os
 
 # Load .env file into environment variables
 load_dotenv()
-# To print the response in readable format. 
-# print(json.dumps(user_name, sort_keys=True, indent=4)) 
+# To print the response in readable format.
+# print(json.dumps(user_name, sort_keys=True, indent=4))
 
-def getSpotifyPlaying(display=False):
+SCOPE = 'user-read-playback-state user-library-read'
+
+
+class SpotifyClient():
+    def __init__(self, client_id=None, client_secret=None, redirect_uri='http://google.com/callback/',
+                 scope=SCOPE, clock=time.monotonic):
+        """
+        Long-lived Spotify connection for polling the currently playing track.
+
+        The OAuth token is held in memory and only refreshed when it is about to
+        expire, all requests go over one HTTP session, and each poll() is a single
+        currently_playing request. Between polls progress() extrapolates the track
+        position from the last reply without touching the network.
+
+        :param client_id: Spotify app id, defaults to $SPOTIFY_API_KEY.
+        :param client_secret: Spotify app secret, defaults to $SPOTIFY_SECRET.
+        :param redirect_uri: Redirect URI registered for the app.
+        :param scope: OAuth scopes requested.
+        """
+        self.oauth = spotipy.SpotifyOAuth(client_id or os.getenv('SPOTIFY_API_KEY'),
+                                          client_secret or os.getenv('SPOTIFY_SECRET'),
+                                          redirect_uri, scope=scope)
+        self.session = requests.Session()
+        self.spotify = spotipy.Spotify(requests_session=self.session)
+        self.clock = clock
+        self.tokenInfo = None
+        self.userName = None
+        # (last track dict returned by poll(), clock() when it was received), replaced
+        # as one tuple so other threads never see a track with another poll's time
+        self.published = (None, None)
+        self.requests = 0
+
+    def token(self):
+        """Access token, read from the cache file on first use and refreshed only once expired"""
+        if self.tokenInfo is None or self.oauth.is_token_expired(self.tokenInfo):
+            self.tokenInfo = self.oauth.validate_token(self.oauth.cache_handler.get_cached_token())
+            if self.tokenInfo is None:
+                raise RuntimeError("No cached Spotify token, authorize the app once to create it")
+            self.spotify.set_auth(self.tokenInfo['access_token'])
+        return self.tokenInfo['access_token']
 
-    username = os.getenv('SPOTIFY_USERNAME')
-    clientID = os.getenv('SPOTIFY_API_KEY')
-    clientSecret = os.getenv('SPOTIFY_SECRET')
-    redirect_uri = 'http://google.com/callback/'
-
-    oauth_object = spotipy.SpotifyOAuth(clientID, clientSecret, redirect_uri,scope='user-read-playback-state user-library-read') 
-    token_dict = oauth_object.get_cached_token() 
-    token = token_dict['access_token'] 
-    spotifyObject = spotipy.Spotify(auth=token) 
-    user_name = spotifyObject.current_user() 
-    # Current track
-    current_track = spotifyObject.currently_playing()
-    if current_track is not None:
-        # user name
-        user_name = spotifyObject.current_user() ['display_name']
-        current_track = spotifyObject.currently_playing()
-        track_id = current_track['item']['id']
-        artists = current_track['item']['artists']
+    def user(self):
+        """Display name of the account, fetched once"""
+        if self.userName is None:
+            self.token()
+            self.requests += 1
+            self.userName = self.spotify.current_user()['display_name']
+        return self.userName
+
+    def poll(self):
+        """
+        Ask Spotify what is playing, one request.
+
+        :return: Dict with User, Track, TrackID, Artist, TrackLength, CurrentTime (ms)
+            and Playing, or None when nothing is playing.
+        """
+        self.token()
+        self.requests += 1
+        current_track = self.spotify.currently_playing()
+        received = self.clock()
+        # Nothing playing, or an ad / podcast episode without track details
+        if current_track is None or current_track.get('item') is None:
+            self.published = (None, received)
+            return None
+
+        item = current_track['item']
+        artists = item['artists']
         if len(artists) == 1:
             artist_name = artists[0]['name']
         else:
             artist_name = ', '.join([artist['name'] for artist in artists])
 
-        progressTime = current_track["progress_ms"]
-        totalTime = current_track['item']['duration_ms']
-
-        if display:
-            print(f"\nUser: {user_name}")
-            # Current track
-            print(f"Currently listening too: {current_track['item']['name']}")
-            print(f'Track ID: {track_id}')
-
-            # Current Artist
-            print(f'Artist(s): {artist_name}')
-            
-            # Time Stamp
-            seconds = (progressTime // 1000) % 60
-            minutes = (progressTime // (1000 * 60)) % 60
-            print(f"Timestamp {minutes:02}:{seconds:02}")
-            seconds = (totalTime // 1000) % 60
-            minutes = (totalTime // (1000 * 60)) % 60
-            print(f"\t\t of {minutes:02}:{seconds:02}")
-            print(spotifyObject.audio_analysis(current_track))
-        
-        return {"User":user_name,"Track":current_track['item']['name'],"TrackID":track_id,"Artist":artist_name,"TrackLength":totalTime,"CurrentTime":progressTime}
-
-    else:
-        return None
+        playing = {"User":self.user(),"Track":item['name'],"TrackID":item['id'],"Artist":artist_name,
+                   "TrackLength":item['duration_ms'],"CurrentTime":current_track['progress_ms'] or 0,
+                   "Playing":bool(current_track.get('is_playing'))}
+        self.published = (playing, received)
+        return playing
+
+    @property
+    def playing(self):
+        """Last track dict returned by poll(), None if nothing is playing"""
+        return self.published[0]
+
+    def estimate(self, published, now):
+        """Estimated position in ms of a published track, None if nothing is playing"""
+        playing, polledAt = published
+        if playing is None:
+            return None
+        position = playing['CurrentTime']
+        if playing['Playing']:
+            elapsed = (self.clock() if now is None else now) - polledAt
+            position += int(elapsed * 1000)
+        return min(position, playing['TrackLength'])
+
+    def progress(self, now=None):
+        """Estimated position in ms of the last polled track, None if nothing is playing"""
+        return self.estimate(self.published, now)
+
+    def remaining(self, now=None):
+        """Estimated ms until the last polled track ends, None if nothing is playing"""
+        published = self.published
+        position = self.estimate(published, now)
+        return None if position is None else published[0]['TrackLength'] - position
+
+
+_client = None
+
+def spotifyClient():
+    """The client shared by getSpotifyPlaying, created on first use"""
+    global _client
+    if _client is None:
+        _client = SpotifyClient()
+    return _client
+
+
+def getSpotifyPlaying(display=False):
+    playing = spotifyClient().poll()
+    if playing is not None and display:
+        print(f"\nUser: {playing['User']}")
+        # Current track
+        print(f"Currently listening too: {playing['Track']}")
+        print(f"Track ID: {playing['TrackID']}")
+
+        # Current Artist
+        print(f"Artist(s): {playing['Artist']}")
+
+        # Time Stamp
+        progressTime = playing['CurrentTime']
+        totalTime = playing['TrackLength']
+        seconds = (progressTime // 1000) % 60
+        minutes = (progressTime // (1000 * 60)) % 60
+        print(f"Timestamp {minutes:02}:{seconds:02}")
+        seconds = (totalTime // 1000) % 60
+        minutes = (totalTime // (1000 * 60)) % 60
+        print(f"\t\t of {minutes:02}:{seconds:02}")
 
+    return playing
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# The panel's one RGBMatrix, created on first use and shared by every app in the process.
+try:
+    from rgbmatrix import RGBMatrix, RGBMatrixOptions
+    runningOnPi = True
+except ModuleNotFoundError:
+    # Off the Pi the apps draw on an emulated panel
+    from emulatedMatrix import RGBMatrix, RGBMatrixOptions
+    runningOnPi = False
+
+
+# Configuration for the matrix
+PANEL_OPTIONS = {
+    'rows'                : 32,
+    'cols'                : 64,
+    'chain_length'        : 2,
+    'parallel'            : 1,
+    'hardware_mapping'    : 'adafruit-hat',
+    'led_rgb_sequence'    : 'RBG',
+    'pixel_mapper_config' : 'Rotate:180',
+}
+PANEL_WIDTH = PANEL_OPTIONS['cols'] * PANEL_OPTIONS['chain_length']
+PANEL_HEIGHT = PANEL_OPTIONS['rows'] * PANEL_OPTIONS['parallel']
+
+
+_matrix = None
+
+def getMatrix():
+    """
+    The shared RGBMatrix, initialized the first time it is asked for.
+
+    Initializing the hardware takes a while and only one RGBMatrix may drive the
+    panel, so every app gets the same instance instead of building its own.
+    """
+    global _matrix
+    if _matrix is None:
+        options = RGBMatrixOptions()
+        for name, value in PANEL_OPTIONS.items():
+            setattr(options, name, value)
+        _matrix = RGBMatrix(options = options)
+        if not runningOnPi:
+            _matrix.configureFromEnvironment()
+    return _matrix
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# Per-stage timing for the display apps and an on-demand cProfile capture.
+#
+# Stages are timed with the timed() decorator or profiler.stage() blocks. While
+# the profiler is disabled both cost one attribute check. Enable it with
+# profiler.enable() or by setting PANEL_PROFILE to a file the summary is written to:
+#
+#   PANEL_PROFILE=/tmp/stages.txt python forestFire.py
+#   kill -USR1 <pid>        # capture 10 s of cProfile into /tmp/capture-<time>.prof
+import cProfile
+import functools
+import os
+import signal
+import sys
+import threading
+import time
+
+
+BUCKETS = 32    # log2 buckets of microseconds, the last one holds everything above ~35 minutes
+
+
+class Histogram():
+    """Counts of durations in power-of-two microsecond buckets, plus total and max"""
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = int(seconds * 1e6)
+        self.buckets[min(us.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper edge in seconds of the bucket holding the q-th percentile"""
+        target = self.count * q / 100
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return (1 << i) / 1e6
+        return 0.0
+
+
+class _NoStage():
+    """Shared do-nothing context manager handed out while disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Stage():
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class Profiler():
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.capture = None
+        self._noStage = _NoStage()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.histograms = {}
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def stage(self, name):
+        """Context manager timing a block as stage name"""
+        if not self.enabled:
+            return self._noStage
+        return _Stage(self.histogram(name))
+
+    def summary(self):
+        """One line per stage: calls, mean, p50, p99 and max in ms"""
+        lines = [f"{'stage':<24}{'calls':>10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name, h in sorted(self.histograms.items()):
+            if h.count:
+                lines.append(f"{name:<24}{h.count:>10}{h.total / h.count * 1000:>10.3f}"
+                             f"{h.percentile(50) * 1000:>10.3f}{h.percentile(99) * 1000:>10.3f}{h.max * 1000:>10.3f}")
+        return "\n".join(lines)
+
+    def dumpEvery(self, seconds, path=None):
+        """
+        Write summary() every few seconds from a daemon thread.
+
+        :param path: File rewritten with the latest summary, stderr if None.
+        """
+        def dump():
+            while True:
+                time.sleep(seconds)
+                text = time.strftime("%H:%M:%S ") + "\n" + self.summary() + "\n"
+                if path is None:
+                    sys.stderr.write(text)
+                else:
+                    with open(path + '.tmp', 'w') as f:
+                        f.write(text)
+                    os.replace(path + '.tmp', path)
+        thread = threading.Thread(target=dump, daemon=True)
+        thread.start()
+        return thread
+
+    def installSignal(self, signum=signal.SIGUSR1, seconds=10, directory='/tmp'):
+        """
+        Capture a cProfile of the main thread for a few seconds whenever signum arrives.
+        The capture is stopped by SIGALRM and saved as capture-<time>.prof in directory.
+        """
+        def start(signum, frame):
+            if self.capture is not None:
+                return
+            self.capture = cProfile.Profile()
+            self.capture.enable()
+            signal.setitimer(signal.ITIMER_REAL, seconds)
+
+        def stop(signum, frame):
+            if self.capture is None:
+                return
+            self.capture.disable()
+            path = os.path.join(directory, time.strftime("capture-%Y%m%d-%H%M%S.prof"))
+            self.capture.dump_stats(path)
+            self.capture = None
+            sys.stderr.write(f"profile written to {path}\n")
+
+        signal.signal(signum, start)
+        signal.signal(signal.SIGALRM, stop)
+
+    def configureFromEnvironment(self):
+        """Enable and dump every 10 s to $PANEL_PROFILE if it is set, and listen for SIGUSR1"""
+        path = os.getenv('PANEL_PROFILE')
+        if path:
+            self.enable()
+            self.dumpEvery(10, path)
+        if hasattr(signal, 'SIGUSR1'):
+            self.installSignal()
+
+
+profiler = Profiler()
+
+
+def timed(name):
+    """Decorator recording each call of the function as stage name while the profiler is enabled"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.histogram(name).record(time.perf_counter() - start)
+        return wrapper
+    return decorator
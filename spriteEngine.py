@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# Pre-rendered sprites moved around the panel, only the rectangles they leave and
+# enter are sent to it.
+from PIL import Image
+import numpy as np
+
+from profiling import timed
+
+
+class SpriteAtlas():
+    def __init__(self, frames):
+        """
+        Every frame of a sprite rendered once up front.
+
+        :param frames: PIL images (or (h, w, 3) uint8 arrays), all the same size.
+        """
+        self.pixels = np.stack([np.asarray(frame.convert('RGB') if isinstance(frame, Image.Image) else frame, dtype=np.uint8)
+                                for frame in frames])
+        self.images = [Image.fromarray(pixels) for pixels in self.pixels]   # ready for canvas.SetImage
+        self.height, self.width = self.pixels.shape[1:3]
+
+    def __len__(self):
+        return len(self.pixels)
+
+
+class Sprite():
+    def __init__(self, atlas, x, y, dx=1, dy=1, frame=0, frame_step=1):
+        """
+        :param atlas: SpriteAtlas the frames come from.
+        :param x, y: Top left corner.
+        :param dx, dy: Pixels moved per bounce() step.
+        :param frame: Atlas frame shown first.
+        :param frame_step: Frames advanced per step.
+        """
+        self.atlas = atlas
+        self.x, self.y = x, y
+        self.dx, self.dy = dx, dy
+        self.frame = frame
+        self.frame_step = frame_step
+
+    @property
+    def rect(self):
+        return (self.x, self.y, self.x + self.atlas.width, self.y + self.atlas.height)
+
+    def bounce(self, width, height):
+        """Move one step inside a width x height area, turning around at the edges, and advance the frame"""
+        if self.x >= width - self.atlas.width or self.x < 1:
+            self.dx = -self.dx
+        if self.y >= height - self.atlas.height or self.y < 1:
+            self.dy = -self.dy
+        self.x += self.dx
+        self.y += self.dy
+        self.frame = (self.frame + self.frame_step) % len(self.atlas)
+
+    def draw(self, canvas):
+        """Draw the current frame with one SetImage of the pre-rendered image"""
+        canvas.SetImage(self.atlas.images[self.frame], self.x, self.y)
+
+
+def clipRect(rect, width, height):
+    x0, y0, x1, y1 = rect
+    x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+    return (x0, y0, x1, y1) if x1 > x0 and y1 > y0 else None
+
+
+def unionRect(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+class SpriteLayer():
+    def __init__(self, width, height, buffers=2, full_threshold=0.5):
+        """
+        Keeps the composed frame of a set of sprites and pushes only what changed.
+
+        Composing the whole frame in numpy is a handful of small copies, what costs
+        on the panel is sending pixels. So for every sprite that moved or changed
+        frame, only the rectangle covering its old and new spot is sent, with one
+        SetImage each.
+
+        :param width: Canvas width in pixels.
+        :param height: Canvas height in pixels.
+        :param buffers: Canvases presented in turn, 2 when drawing on an offscreen
+            canvas swapped with SwapOnVSync, 1 when drawing on the matrix directly.
+            Each canvas still shows what was sent to it buffers frames ago, so the
+            rectangles of the last buffers frames are sent.
+        :param full_threshold: Fraction of the frame above which one full SetImage is sent instead.
+        """
+        self.width, self.height = width, height
+        self.buffers = buffers
+        self.full_threshold = full_threshold
+        self.background = np.zeros((height, width, 3), dtype=np.uint8)
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.image = Image.new('RGB', (width, height))
+        self.sprites = []
+        self.drawn = {}         # sprite -> (rect, frame) it was last composed with
+        self.recent = []        # dirty rects of the last buffers frames
+        self.fullFrames = buffers
+        self.frames = 0
+        self.rectsSent = 0
+        self.pixelsSent = 0
+
+    def add(self, sprite):
+        self.sprites.append(sprite)
+        return sprite
+
+    def remove(self, sprite):
+        self.sprites.remove(sprite)
+
+    def compose(self):
+        """Redraw the frame from the background and the sprites, in the order they were added"""
+        np.copyto(self.frame, self.background)
+        for sprite in self.sprites:
+            area = clipRect(sprite.rect, self.width, self.height)
+            if area is None:
+                continue
+            x0, y0, x1, y1 = area
+            pixels = sprite.atlas.pixels[sprite.frame]
+            np.copyto(self.frame[y0:y1, x0:x1], pixels[y0 - sprite.y:y1 - sprite.y, x0 - sprite.x:x1 - sprite.x])
+
+    def dirtyRects(self):
+        """Rectangles changed since the last present(), one per changed sprite"""
+        rects = []
+        current = {}
+        for sprite in self.sprites:
+            state = (sprite.rect, sprite.frame)
+            current[sprite] = state
+            before = self.drawn.get(sprite)
+            if before != state:
+                rects.append(state[0] if before is None else unionRect(before[0], state[0]))
+        for sprite, (rect, _) in self.drawn.items():
+            if sprite not in current:   # removed since the last frame
+                rects.append(rect)
+        self.drawn = current
+        return [r for r in (clipRect(rect, self.width, self.height) for rect in rects) if r is not None]
+
+    @timed('sprites.present')
+    def present(self, canvas):
+        """Bring canvas up to date with the sprites"""
+        self.recent.append(self.dirtyRects())
+        self.recent = self.recent[-self.buffers:]
+        self.compose()
+        self.frames += 1
+
+        rects = [rect for rects in self.recent for rect in rects]
+        area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rects)
+        if self.fullFrames or area > self.full_threshold * self.width * self.height:
+            self.image.frombytes(self.frame.data)
+            canvas.SetImage(self.image, 0, 0)
+            self.fullFrames = max(0, self.fullFrames - 1)
+            self.rectsSent += 1
+            self.pixelsSent += self.width * self.height
+            return
+
+        for x0, y0, x1, y1 in rects:
+            canvas.SetImage(Image.fromarray(self.frame[y0:y1, x0:x1]), x0, y0)
+        self.rectsSent += len(rects)
+        self.pixelsSent += area
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# Seeded checks that the simulation engines follow the same model.
+#
+#   python -m pytest -q test_forestFire.py
+from functools import lru_cache
+import numpy as np
+
+from forestFire import ForestFire, ForestFireBatch, TreeState
+
+
+# Rates high enough that a 20x12 grid sees growth, lightning and fire within a few generations
+PROBABILITIES = {
+    'BasicTree' : {
+        'GrowthSpreadRate'  : 0.2,
+        'NaturalDeathRate'  : 0.05,
+        'LightningRate'     : 0.02,
+        'FireSpreadRate'    : 0.6,
+        'FireDeathRate'     : 0.3,
+        'FireExtinguishRate': 0.2
+    },
+    'OldGrowth' : {
+        'GrowthSpreadRate'  : 0.1,
+        'NaturalDeathRate'  : 0.02,
+        'LightningRate'     : 0.01,
+        'FireSpreadRate'    : 0.3,
+        'FireDeathRate'     : 0.1,
+        'FireExtinguishRate': 0.1
+    }
+}
+WIDTH, HEIGHT = 20, 12
+DENSITY = 0.3
+SEEDS = range(150)
+GENERATIONS = 8
+
+
+@lru_cache(maxsize=None)
+def stateFractions(engine):
+    """Fraction of cells in each TreeState after GENERATIONS cycles, one row per seed (cached, the loop engine is slow)"""
+    fractions = np.empty((len(SEEDS), len(TreeState)))
+    for row, seed in enumerate(SEEDS):
+        forest = ForestFire(timestep=0, probs=PROBABILITIES, density=DENSITY, seed=seed,
+                            engine=engine, width=WIDTH, height=HEIGHT)
+        for _ in range(GENERATIONS):
+            forest.cycle()
+        fractions[row] = np.bincount(forest.forest.reshape(-1), minlength=len(TreeState)) / forest.forest.size
+    return fractions
+
+
+def assertSameMeans(a, b, sigmas=4):
+    """Mean state fractions agree within sigmas standard errors of their difference"""
+    se = np.sqrt(a.var(axis=0, ddof=1) / len(a) + b.var(axis=0, ddof=1) / len(b))
+    difference = np.abs(a.mean(axis=0) - b.mean(axis=0))
+    assert np.all(difference <= sigmas * se + 1e-12), f"means differ by {difference}, standard error {se}"
+
+
+def test_numpyMatchesLoop():
+    assertSameMeans(stateFractions('numpy'), stateFractions('loop'))
+
+
+def test_frontierMatchesLoop():
+    assertSameMeans(stateFractions('frontier'), stateFractions('loop'))
+
+
+def test_batchMatchesSingleForests():
+    seeds = [3, 17, 1000]
+    batch = ForestFireBatch(PROBABILITIES, seeds, density=DENSITY, width=WIDTH, height=HEIGHT)
+    forests = [ForestFire(timestep=0, probs=PROBABILITIES, density=DENSITY, seed=seed,
+                          engine='numpy', width=WIDTH, height=HEIGHT) for seed in seeds]
+    for _ in range(GENERATIONS):
+        batch.cycle()
+        for forest in forests:
+            forest.cycle()
+        for b, forest in enumerate(forests):
+            assert np.array_equal(batch.forest[b], forest.forest)
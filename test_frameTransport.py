@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# Frames streamed over loopback end up on an emulated panel exactly as simulated.
+#
+#   python -m pytest -q test_frameTransport.py
+import threading
+import numpy as np
+import pytest
+
+from emulatedMatrix import RGBMatrix, RGBMatrixOptions
+from forestFire import ForestFire, DEFAULT_PROBABILITIES
+from frameTransport import FrameSender, FrameReceiver, MODES
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_loopbackStreamIsPixelExact(mode):
+    options = RGBMatrixOptions()
+    options.rows, options.cols, options.chain_length = 32, 64, 2
+    matrix = RGBMatrix(options=options)
+    receiver = FrameReceiver(matrix=matrix, host='127.0.0.1', port=0)
+    forest = ForestFire(timestep=0, probs=DEFAULT_PROBABILITIES, density=0.05, seed=7, width=128, height=32)
+    sender = FrameSender('127.0.0.1', receiver.port, mode=mode, keyframe_every=10, drop_when_busy=False)
+    thread = threading.Thread(target=receiver.run, kwargs={'timeout': 5})
+    thread.start()
+    try:
+        sender.connect()
+        sender.sendPalette(forest.palette)
+        for _ in range(100):
+            forest.cycle()
+            sender.send(forest.forest)
+    finally:
+        sender.close()      # the receiver shows what is left and returns when the sender hangs up
+        thread.join(timeout=10)
+        receiver.close()
+
+    assert not thread.is_alive()
+    assert receiver.framesReceived == 100
+    assert receiver.framesMissing == 0
+    assert np.array_equal(receiver.grid, forest.forest)
+    assert np.array_equal(matrix.pixels, forest.palette[forest.forest])
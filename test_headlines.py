@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# Headline fetching against a local stub of the top stories endpoint.
+#
+#   python -m pytest -q test_headlines.py
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+from fetchHeadlines import HeadlineFetcher, _fetchers
+from textDriver import RunText
+
+
+class StubStories(BaseHTTPRequestHandler):
+    """Serves /<section>.json with an ETag, answers 304 to a matching If-None-Match, 500 while failing"""
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.failing:
+            self.send_response(500)
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        section = self.path.split('?')[0].strip('/').removesuffix('.json')
+        body = json.dumps({'results': [{'title': f'{section} {n}'} for n in range(2)]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', server.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def stubServer():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubStories)
+    server.requests = []
+    server.failing = False
+    server.etag = '"v1"'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_conditionalGetReusesEtag():
+    server, url = stubServer()
+    try:
+        fetcher = HeadlineFetcher(base_url=url, ttl=0)
+        assert fetcher.section('world') == ['world 0', 'world 1']
+        assert fetcher.section('world') == ['world 0', 'world 1']
+        assert len(server.requests) == 2
+        assert 'If-None-Match' not in server.requests[0]
+        assert server.requests[1]['If-None-Match'] == '"v1"'    # answered with a 304
+        assert fetcher.cache['world']['etag'] == '"v1"'         # kept although the 304 had none
+    finally:
+        server.shutdown()
+
+
+def test_headlinesKeepLastGoodValue():
+    server, url = stubServer()
+    try:
+        runText = RunText(text="Loading headlines...", headline_sections=('world', 'us'), headline_url=url)
+        headlines = runText.headlineFetcher()
+
+        server.failing = True
+        assert not headlines.fetchOnce()
+        assert headlines.latest == "Loading headlines..."
+
+        server.failing = False
+        assert headlines.fetchOnce()
+        assert headlines.latest == "world 0. world 1. us 0. us 1. "
+
+        # once the cache is stale a failed revalidation falls back to the cached titles
+        _fetchers[(url, 10)].ttl = 0
+        server.failing = True
+        requests = len(server.requests)
+        headlines.fetchOnce()
+        assert len(server.requests) == requests + 2
+        assert headlines.latest == "world 0. world 1. us 0. us 1. "
+    finally:
+        server.shutdown()
@@ -1,15 +1,22 @@
 #!/usr/bin/env python
 # Display a runtext with double-buffering.
-from samplebase import SampleBase
-from rgbmatrix import graphics
-from fetchHeadlines import fetch_headlines
+try:
+    from samplebase import SampleBase
+except ModuleNotFoundError:
+    from emulatedMatrix import SampleBase
+from fetchHeadlines import fetch_headlines, NYT_TOP_STORIES
 import datetime
-import time
-from importSpotify import getSpotifyPlaying
+from importSpotify import getSpotifyPlaying, spotifyClient
+from frameScheduler import FrameScheduler
+from profiling import profiler
+from backgroundFetch import BackgroundFetcher
+from textLayer import BdfFont, TextLine, ClockLine, TextCompositor
 import os
 
 class RunText(SampleBase):
-    def __init__(self, text, font_path="fonts/8x13.bdf", news_color=(255, 255, 0), scroll_speed=0.05, *args, **kwargs):
+    def __init__(self, text, font_path="fonts/8x13.bdf", news_color=(255, 255, 0), scroll_speed=0.05,
+                 headline_sections=('world','us','business','politics','arts'), headline_interval=600,
+                 headline_url=NYT_TOP_STORIES, spotify=False, spotify_interval=15, *args, **kwargs):
         """
         Initialize the RunText class with customizable inputs.
         
@@ -17,70 +24,147 @@ class RunText(SampleBase):
         :param font_path: Path to the font file.
         :param text_color: A tuple (R, G, B) representing text color.
         :param scroll_speed: Speed of the scrolling text (seconds per frame).
+        :param headline_sections: NYT sections fetched in the background for the news line.
+        :param headline_interval: Seconds between headline fetches.
+        :param headline_url: Top stories endpoint, point it at a local server for testing.
+        :param spotify: Show the currently playing Spotify track.
+        :param spotify_interval: Seconds between Spotify polls.
         """
         super(RunText, self).__init__(*args, **kwargs)
         self.text = text
         self.font_path = font_path
         self.news_color = news_color
         self.scroll_speed = scroll_speed
+        self.headline_sections = list(headline_sections)
+        self.headline_interval = headline_interval
+        self.headline_url = headline_url
+        self.spotify = spotify
+        self.spotify_interval = spotify_interval
+
+    def setup(self, width):
+        """
+        Load the fonts, build the text lines and start the background fetchers.
+        Used by run() and by displayRuntime's TextScene, which draws over other scenes.
+
+        :param width: Width of the canvas the text scrolls across.
+        """
+        self.width = width
+        # Every string is rasterized once and only re-rendered when it changes,
+        # a frame is a handful of window copies and one SetImage
+        font = BdfFont(self.font_path)
+        font2 = BdfFont('fonts/6x9.bdf')
+        font3 = BdfFont('fonts/6x10.bdf')
+        self.newsLine = TextLine(font, self.news_color, 9, self.text)
+        self.dateLine = ClockLine(font2, (180,255,70), 25, "%a %b %d")
+        self.timeLine = ClockLine(font2, (180,255,70), 32, "%I:%M:%S")
+        self.trackLine = TextLine(font3, (80,0,255), 17)
+        self.pos = width
+        self.pos2 = 0
+        self.trackScrolls = 0      # times the track line turned around
+        self.playing = None
+        # playingText = f'{playing["Track"]} - {playing["Artist"]}'
+        self.playingText = None
+        self.inc = 0.25  # incriment for spotify track position change
+        self.text_length = 0
+        self.text_length2 = 0
+        self.refreshedAt = None  # nowPlaying.version an end-of-track refresh was asked for
+
+        # The network is only touched from these worker threads, scroll() and
+        # draw() just pick up whatever they last published
+        self.headlines = self.headlineFetcher().start()
+        self.nowPlaying = BackgroundFetcher(getSpotifyPlaying, interval=self.spotify_interval, name='spotify')
+        if self.spotify:
+            self.nowPlaying.start()
+
+    def headlineFetcher(self):
+        """BackgroundFetcher for the news line, keeping the last good headlines when a fetch fails"""
+        return BackgroundFetcher(
+            lambda: fetch_headlines(self.headline_sections, base_url=self.headline_url),
+            interval=self.headline_interval,
+            initial=self.text,
+            valid=lambda text: bool(text.strip('. ')) and text != "-- ERROR --",
+            name='headlines')
+
+    def stop(self):
+        """Stop the background fetchers started by setup()"""
+        self.headlines.stop(timeout=1)
+        self.nowPlaying.stop(timeout=1)
+
+    def scroll(self):
+        """Move the news and the Spotify track one step"""
+        nowPlaying = self.nowPlaying
+        # Scroll the news
+        self.pos -= 1
+        if self.pos + self.text_length < 0:
+            self.pos = 0
+            self.text = self.headlines.latest    # only swap text between scrolls
+
+        # Scroll spotify track
+        if self.playing is None and nowPlaying.latest is not None:
+            self.playing = nowPlaying.latest
+            self.playingText = f'{self.playing["Track"]} - {self.playing["Artist"]}'
+        if self.playing != None:
+            self.pos2 -= self.inc
+            if self.pos2 + self.text_length2 < self.width:
+                self.inc = self.inc*-1
+                self.trackScrolls += 1
+            if self.pos2  > 0:
+                self.inc = self.inc*-1
+                self.trackScrolls += 1
+            # Progress is extrapolated locally, poll again as soon as the track should be over
+            if spotifyClient().remaining() == 0 and self.refreshedAt != nowPlaying.version:
+                self.refreshedAt = nowPlaying.version
+                nowPlaying.refreshNow()
+            if self.trackScrolls == 6:     # Update every 2 scrolls
+                self.playing = nowPlaying.latest
+                if self.playing is not None:
+                    self.playingText = f'{self.playing["Track"]} - {self.playing["Artist"]}'
+                self.trackScrolls = 0
+
+    def draw(self, frame):
+        """Draw the lines into an (height, width, 3) frame, leaving the pixels between the letters alone"""
+        with profiler.stage('text.drawNews'):
+            self.newsLine.setText(self.text)
+            self.text_length = self.newsLine.draw(frame, self.pos)
+
+        # Get the time
+        self.dateLine.update()
+        self.timeLine.update()
+        self.dateLine.draw(frame, 0)
+        self.timeLine.draw(frame, 0)
+
+        if self.playing != None:
+            self.trackLine.setText(self.playingText)
+            self.text_length2 = self.trackLine.draw(frame, self.pos2)
 
     def run(self):
         offscreen_canvas = self.matrix.CreateFrameCanvas()
-        font = graphics.Font()
-        font.LoadFont(self.font_path)
-        font2 = graphics.Font()
-        font2.LoadFont('fonts/6x9.bdf')
-        font3 = graphics.Font()
-        font3.LoadFont('fonts/6x10.bdf')
-        NewsColor = graphics.Color(*self.news_color)
-        pos = offscreen_canvas.width
-        pos2 = 0
-        scrollCounter = [0,0]
-        playing = getSpotifyPlaying()
-        playing = None
-        # playingText = f'{playing["Track"]} - {playing["Artist"]}'
-        inc = 0.25  # incriment for spotify track position change
-        while True:
-            offscreen_canvas.Clear()
-            
-            # Scroll the news
-            text_length = graphics.DrawText(offscreen_canvas, font, pos, 9, NewsColor, self.text)
-            pos -= 1
-            if pos + text_length < 0:
-                pos = 0
-                scrollCounter[0] += 1
-                if scrollCounter[0] == 15:     # Update every 15 scrolls
-                    self.text=fetch_headlines(['world','us','business','politics','arts'])
-                    scrollCounter[0] = 0
-
-            # Get the time
-            currentDT = time.strftime("%a %b %d")
-            currentDT2= time.strftime("%I:%M:%S")
-            graphics.DrawText(offscreen_canvas, font2, 0, 25, graphics.Color(180,255,70), currentDT)
-            graphics.DrawText(offscreen_canvas, font2, 0, 32, graphics.Color(180,255,70), currentDT2)
-            
-            # Scroll spotify track
-            if playing != None:
-                text_length2 = graphics.DrawText(offscreen_canvas, font3, pos2, 17, graphics.Color(80,0,255), playingText)
-                pos2 -= inc
-                if pos2 + text_length2 < offscreen_canvas.width:
-                    inc = inc*-1
-                    scrollCounter [1]+= 1
-                if pos2  > 0:
-                    inc = inc*-1
-                    scrollCounter [1]+= 1
-                if scrollCounter[1] == 6:     # Update every 2 scrolls
-                    playing = getSpotifyPlaying()
-                    playingText = f'{playing["Track"]} - {playing["Artist"]}'
-                    scrollCounter[1] = 0
-
-            # wait
-            time.sleep(self.scroll_speed)
-            offscreen_canvas = self.matrix.SwapOnVSync(offscreen_canvas)
+        compositor = TextCompositor(offscreen_canvas.width, offscreen_canvas.height)
+        self.setup(offscreen_canvas.width)
+
+        def step():
+            with profiler.stage('text.step'):
+                self.scroll()
+
+        def render():
+            nonlocal offscreen_canvas
+            with profiler.stage('text.render'):
+                compositor.clear()
+                self.draw(compositor.frame)
+                compositor.present(offscreen_canvas)
+            with profiler.stage('text.swap'):
+                offscreen_canvas = self.matrix.SwapOnVSync(offscreen_canvas)
+
+        # one scroll step every scroll_speed seconds, frames are skipped if drawing falls behind
+        try:
+            FrameScheduler(sim_rate=1 / self.scroll_speed).run(step, render)
+        finally:
+            self.stop()
 
 
 # Main function
 if __name__ == "__main__":
+    profiler.configureFromEnvironment()
     # Instantiate the class with your desired parameters
     run_text = RunText(
         text=fetch_headlines(['world','us','business','politics']), 
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# Pre-rendered text for the marquee: strings are rasterized once and scrolled as bitmap slices.
+from PIL import Image
+import numpy as np
+import time
+
+from profiling import timed
+
+
+class BdfFont():
+    def __init__(self, path):
+        """
+        Minimal BDF reader, enough for the fixed fonts shipped with rpi-rgb-led-matrix.
+
+        Glyphs are placed the way graphics.DrawText places them: y is the baseline and
+        the advance of each character is its DWIDTH.
+
+        :param path: Path to the .bdf file.
+        """
+        self.path = path
+        self.glyphs = {}    # codepoint -> (bool mask, advance, x offset, row below the top of the line)
+        self.parse(path)
+
+    def parse(self, path):
+        with open(path, encoding='latin-1') as f:
+            lines = iter(f.read().splitlines())
+        ascent = descent = None
+        for line in lines:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == 'FONTBOUNDINGBOX':
+                box_height, box_y = int(words[2]), int(words[4])
+            elif words[0] == 'FONT_ASCENT':
+                ascent = int(words[1])
+            elif words[0] == 'FONT_DESCENT':
+                descent = int(words[1])
+            elif words[0] == 'STARTCHAR':
+                if ascent is None:
+                    ascent, descent = box_height + box_y, -box_y
+                self.ascent, self.descent = ascent, descent
+                self.height = ascent + descent
+                self.parseGlyph(lines)
+
+    def parseGlyph(self, lines):
+        codepoint, advance, bbx = -1, 0, (0, 0, 0, 0)
+        for line in lines:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == 'ENCODING':
+                codepoint = int(words[1])
+            elif words[0] == 'DWIDTH':
+                advance = int(words[1])
+            elif words[0] == 'BBX':
+                bbx = tuple(int(w) for w in words[1:5])
+            elif words[0] == 'BITMAP':
+                width, height, x_off, y_off = bbx
+                rows = [next(lines).strip() for _ in range(height)]
+                mask = np.zeros((height, width), dtype=bool)
+                for r, row in enumerate(rows):
+                    if row:
+                        bits = int(row, 16)
+                        total = len(row) * 4
+                        mask[r] = [(bits >> (total - 1 - c)) & 1 for c in range(width)]
+                if codepoint >= 0:
+                    self.glyphs[codepoint] = (mask, advance, x_off, self.ascent - (height + y_off))
+            elif words[0] == 'ENDCHAR':
+                return
+
+    def glyph(self, char):
+        """Glyph for a character, the replacement character or None if the font has neither"""
+        return self.glyphs.get(ord(char)) or self.glyphs.get(0xFFFD)
+
+    def measure(self, text):
+        """Advance in pixels, what graphics.DrawText would return"""
+        return sum(g[1] for g in map(self.glyph, text) if g is not None)
+
+    @timed('text.rasterize')
+    def render(self, text):
+        """Rasterize text into a bool array of shape (height, measure(text))"""
+        mask = np.zeros((self.height, self.measure(text)), dtype=bool)
+        x = 0
+        for char in text:
+            g = self.glyph(char)
+            if g is None:
+                continue
+            bitmap, advance, x_off, top = g
+            # clip glyphs that reach outside the line or before the first column
+            r0, c0 = max(0, top), max(0, x + x_off)
+            r1 = min(self.height, top + bitmap.shape[0])
+            c1 = min(mask.shape[1], x + x_off + bitmap.shape[1])
+            if r1 > r0 and c1 > c0:
+                mask[r0:r1, c0:c1] |= bitmap[r0 - top:r1 - top, c0 - x - x_off:c1 - x - x_off]
+            x += advance
+        return mask
+
+
+class TextLine():
+    def __init__(self, font, color, baseline, text=''):
+        """
+        One line of text kept as a pre-rendered bitmap.
+
+        The string is only rasterized when setText() is given a different one, so
+        drawing it at a new x costs a window copy no matter how long the text is.
+
+        :param font: BdfFont to render with.
+        :param color: A tuple (R, G, B).
+        :param baseline: Row of the baseline, the y passed to graphics.DrawText.
+        """
+        self.font = font
+        self.color = np.array(color, dtype=np.uint8)
+        self.baseline = baseline
+        self.text = None
+        self.mask = None
+        self.renders = 0
+        self.setText(text)
+
+    def setText(self, text):
+        if text != self.text:
+            self.text = text
+            self.mask = self.font.render(text)
+            self.renders += 1
+
+    @property
+    def width(self):
+        return self.mask.shape[1]
+
+    def draw(self, frame, x):
+        """
+        Copy the visible part of the line into an (height, width, 3) frame with its left edge at x.
+
+        :return: Width of the text in pixels, like graphics.DrawText.
+        """
+        x = int(x)
+        top = self.baseline - self.font.ascent
+        r0, r1 = max(0, top), min(frame.shape[0], top + self.font.height)
+        c0, c1 = max(0, x), min(frame.shape[1], x + self.width)
+        if r1 > r0 and c1 > c0:
+            window = self.mask[r0 - top:r1 - top, c0 - x:c1 - x]
+            np.copyto(frame[r0:r1, c0:c1], self.color, where=window[..., None])
+        return self.width
+
+
+class ClockLine(TextLine):
+    def __init__(self, font, color, baseline, format, clock=time.time):
+        """
+        A TextLine showing time.strftime(format), re-rendered only when the second changes.
+
+        :param format: strftime format, e.g. "%I:%M:%S".
+        """
+        self.format = format
+        self.clock = clock
+        self.second = int(clock())
+        super(ClockLine, self).__init__(font, color, baseline, time.strftime(format, time.localtime(self.second)))
+
+    def update(self):
+        second = int(self.clock())
+        if second != self.second:
+            self.second = second
+            self.setText(time.strftime(self.format, time.localtime(second)))
+
+
+class TextCompositor():
+    def __init__(self, width, height):
+        """
+        Frame the text lines are drawn into, pushed to a canvas with one SetImage.
+
+        :param width: Canvas width in pixels.
+        :param height: Canvas height in pixels.
+        """
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.image = Image.new('RGB', (width, height))
+
+    def clear(self):
+        self.frame.fill(0)
+
+    @timed('text.present')
+    def present(self, canvas):
+        self.image.frombytes(self.frame.data)
+        canvas.SetImage(self.image, 0, 0)
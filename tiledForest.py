@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# Simulate forests much larger than the panel on several cores: the grid is cut
+# into horizontal strips in shared memory and each worker process steps its own.
+from multiprocessing import shared_memory
+import multiprocessing
+import os
+import signal
+import time
+import numpy as np
+
+from forestFire import TreeState, PALETTES, DEFAULT_PROBABILITIES, GridWorkspace, ForestStats, burnGrid, growGrid, plantForest
+from matrixConfig import getMatrix, runningOnPi, PANEL_WIDTH, PANEL_HEIGHT
+from deltaDisplay import DeltaDisplay
+from frameScheduler import FrameScheduler
+
+
+# Passes of one cycle, in the order of ForestFire.cycle
+PASSES = (
+    (burnGrid, 'BasicTree', TreeState.ALIVE, ('FireSpreadRate', 'FireDeathRate', 'FireExtinguishRate')),
+    (growGrid, 'BasicTree', TreeState.ALIVE, ('GrowthSpreadRate', 'NaturalDeathRate', 'LightningRate')),
+    (burnGrid, 'OldGrowth', TreeState.OLD_GROWTH, ('FireSpreadRate', 'FireDeathRate', 'FireExtinguishRate')),
+    (growGrid, 'OldGrowth', TreeState.OLD_GROWTH, ('GrowthSpreadRate', 'NaturalDeathRate', 'LightningRate')),
+)
+
+# Order in which states win when a block of cells is shown as one pixel: fire
+# first, then old growth, young trees and empty ground. The table maps a state
+# to its rank and, being a swap, a rank back to its state.
+SHOW_RANK = np.array([TreeState.DEAD, TreeState.ALIVE, TreeState.OLD_GROWTH, TreeState.BURNING], dtype=np.uint8)
+
+
+def stripBounds(height, strips):
+    """Row where each strip starts, plus height at the end"""
+    return [height * i // strips for i in range(strips + 1)]
+
+
+def sharedLayout(height, width, strips):
+    """Byte offsets in the shared block: both grids, per-strip counts, then the command word"""
+    gridBytes = 2 * height * width
+    countsOffset = (gridBytes + 7) // 8 * 8
+    controlOffset = countsOffset + strips * len(TreeState) * 8
+    return countsOffset, controlOffset, controlOffset + 8
+
+
+class StripWorker():
+    def __init__(self, grids, top, bottom, probs, seed):
+        """
+        Steps rows top:bottom of a shared pair of grids.
+
+        A pass reads the strip plus one halo row above and below from the front grid
+        and writes only its own rows into the back grid. As long as every strip of
+        a pass finishes before the next pass starts, the N/S/E/W rules of burnGrid
+        and growGrid see exactly the same neighbours as on the whole grid.
+
+        :param grids: uint8 array (2, height, width), front and back grid.
+        :param top: First row of the strip.
+        :param bottom: Row after the last row of the strip.
+        :param probs: Probabilities dict as used by ForestFire.
+        :param seed: SeedSequence (or seed) of this strip's PRNG.
+        """
+        self.grids = grids
+        self.top, self.bottom = top, bottom
+        height = grids.shape[1]
+        self.haloTop = max(top - 1, 0)
+        self.haloBottom = min(bottom + 1, height)
+        self.rows = slice(top - self.haloTop, bottom - self.haloTop)   # own rows inside the halo block
+        self.prng = np.random.default_rng(seed)
+
+        shape = (self.haloBottom - self.haloTop, grids.shape[2])
+        self.work = GridWorkspace(shape)
+        self.work.draws.fill(0)     # halo rows are computed but never kept
+        self.out = np.empty(shape, dtype=np.uint8)
+        self.passes = [(grid, TreeType, tuple(probs[treeName][rate] for rate in rates))
+                       for grid, treeName, TreeType, rates in PASSES]
+
+    def runPass(self, index, front):
+        """Apply pass index to the strip, reading grids[front] and writing grids[1 - front]"""
+        grid, TreeType, rates = self.passes[index]
+        self.prng.random(out=self.work.draws[self.rows])
+        block = self.grids[front, self.haloTop:self.haloBottom]
+        grid(block, self.out, self.work.draws, TreeType, *rates, self.work)
+        np.copyto(self.grids[1 - front, self.top:self.bottom], self.out[self.rows])
+
+    def count(self, front, out):
+        """Number of cells of the strip in each TreeState"""
+        out[:] = np.bincount(self.grids[front, self.top:self.bottom].ravel(), minlength=len(TreeState))
+
+
+def runStrips(workers, counts, generations, passBarrier=None):
+    """
+    Step a set of strips for a number of generations and write their counts.
+
+    Every pass swaps the grids, and with an even number of passes per cycle the
+    front grid is grids[0] again at the end of each generation.
+    """
+    for generation in range(generations):
+        for index in range(len(PASSES)):
+            for worker in workers:
+                worker.runPass(index, index % 2)
+            if passBarrier is not None:
+                passBarrier.wait()
+    for worker, out in zip(workers, counts):
+        worker.count(0, out)
+
+
+def tiledProcess(name, shape, strips, assigned, probs, seeds, syncBarrier, passBarrier):
+    """
+    Worker process: attach to the shared grids, then repeatedly wait for a command,
+    step its strips and report back. A negative command ends the worker.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    height, width = shape
+    countsOffset, controlOffset, _ = sharedLayout(height, width, strips)
+    shm = shared_memory.SharedMemory(name=name)
+    grids = counts = control = None
+    try:
+        grids = np.ndarray((2, height, width), dtype=np.uint8, buffer=shm.buf)
+        counts = np.ndarray((strips, len(TreeState)), dtype=np.int64, buffer=shm.buf, offset=countsOffset)
+        control = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=controlOffset)
+        bounds = stripBounds(height, strips)
+        workers = [StripWorker(grids, bounds[i], bounds[i + 1], probs, seeds[i]) for i in assigned]
+        mine = [counts[i] for i in assigned]
+        while True:
+            syncBarrier.wait()
+            generations = int(control[0])
+            if generations < 0:
+                break
+            runStrips(workers, mine, generations, passBarrier)
+            syncBarrier.wait()
+    except Exception:
+        # wake everybody else up instead of leaving them at a barrier
+        syncBarrier.abort()
+        passBarrier.abort()
+        raise
+    finally:
+        del grids, counts, control
+        shm.close()
+
+
+class TiledForest():
+    def __init__(self, probs, width=8192, height=8192, density=0.000245, seed=1000, workers=None, strips=None,
+                 timestep=0.01, palette='Yellow-Blue'):
+        """
+        ForestFire's numpy engine spread over worker processes, for grids far larger than the panel.
+
+        The grid is split into horizontal strips, each with its own PRNG spawned from
+        seed, so a run is reproducible for a given number of strips regardless of how
+        the work is scheduled. By default there is one strip per worker.
+
+        :param probs: Probabilities dict as used by ForestFire.
+        :param width: Forest width in cells.
+        :param height: Forest height in cells.
+        :param density: Density of trees in the forest, 1 for full.
+        :param seed: Seed of the initial forest and of every strip's PRNG.
+        :param workers: Worker processes, defaults to the number of cores. 0 steps every
+            strip in this process, which gives the same result as any number of workers.
+        :param strips: Number of strips, defaults to max(workers, 1).
+        :param timestep: Seconds per cycle when run() shows the forest.
+        :param palette: Name of an entry in PALETTES, or a (4, 3) array of RGB rows per state.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        strips = strips or max(workers, 1)
+        if strips > height:
+            raise ValueError(f"cannot cut {height} rows into {strips} strips")
+        self.probArray = probs
+        self.width, self.height = width, height
+        self.workers = min(workers, strips)
+        self.strips = strips
+        self.timestep = timestep
+        self.palette = np.ascontiguousarray(PALETTES[palette] if isinstance(palette, str) else palette, dtype=np.uint8)
+
+        seedSequence = np.random.SeedSequence(seed)
+        plantSeed, stripSeeds = seedSequence.spawn(2)
+        self.seeds = stripSeeds.spawn(strips)
+
+        countsOffset, controlOffset, nbytes = sharedLayout(height, width, strips)
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.grids = np.ndarray((2, height, width), dtype=np.uint8, buffer=self.shm.buf)
+        self.stripCounts = np.ndarray((strips, len(TreeState)), dtype=np.int64, buffer=self.shm.buf, offset=countsOffset)
+        self.control = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=controlOffset)
+        self.grids[0] = plantForest(np.random.default_rng(plantSeed), height, width, density)
+
+        self.stats = ForestStats()
+        self.stats.recount(self.forest)
+        self.generation = 0
+        self.processes = []
+        self.local = None
+        self.downsampleRanks = None
+
+    @property
+    def forest(self):
+        """The current grid (a view into shared memory, valid until the next step)"""
+        return self.grids[0]
+
+    def start(self):
+        """Start the worker processes, done by the first step() if not called before"""
+        if self.processes or self.local is not None:
+            return
+        bounds = stripBounds(self.height, self.strips)
+        if self.workers == 0:
+            self.local = [StripWorker(self.grids, bounds[i], bounds[i + 1], self.probArray, self.seeds[i])
+                          for i in range(self.strips)]
+            return
+
+        self.syncBarrier = multiprocessing.Barrier(self.workers + 1)
+        self.passBarrier = multiprocessing.Barrier(self.workers)
+        for w in range(self.workers):
+            assigned = list(range(w, self.strips, self.workers))
+            process = multiprocessing.Process(
+                target=tiledProcess, name=f'tile-{w}', daemon=True,
+                args=(self.shm.name, (self.height, self.width), self.strips, assigned,
+                      self.probArray, self.seeds, self.syncBarrier, self.passBarrier))
+            process.start()
+            self.processes.append(process)
+
+    def step(self, generations=1):
+        """Advance every strip by a number of generations and update the stats"""
+        self.start()
+        if self.local is not None:
+            runStrips(self.local, self.stripCounts, generations)
+        else:
+            self.control[0] = generations
+            self.syncBarrier.wait()     # go
+            self.syncBarrier.wait()     # every strip is done
+        self.generation += generations
+        self.stats.counts[:] = self.stripCounts.sum(axis=0)
+        self.stats.record()
+
+    def cycle(self):
+        self.step(1)
+
+    def viewport(self, top, left, height, width, out=None):
+        """Copy of a height x width window of the forest, e.g. to show a panel-sized part of it"""
+        if out is None:
+            out = np.empty((height, width), dtype=np.uint8)
+        np.copyto(out, self.forest[top:top + height, left:left + width])
+        return out
+
+    def downsample(self, height, width, out=None):
+        """
+        Whole forest shrunk to height x width, each pixel showing the most notable
+        state of its block (burning, then old growth, alive, dead). Rows and
+        columns that do not fill a whole block are left out.
+        """
+        blockRows, blockCols = self.height // height, self.width // width
+        if self.downsampleRanks is None or self.downsampleRanks.shape != (height * blockRows, width * blockCols):
+            self.downsampleRanks = np.empty((height * blockRows, width * blockCols), dtype=np.uint8)
+        ranks = self.downsampleRanks
+        np.take(SHOW_RANK, self.forest[:ranks.shape[0], :ranks.shape[1]], out=ranks)
+        blocks = ranks.reshape(height, blockRows, width, blockCols).max(axis=(1, 3))
+        if out is None:
+            out = np.empty((height, width), dtype=np.uint8)
+        np.take(SHOW_RANK, blocks, out=out)
+        return out
+
+    def run(self, display_fps=None, height=None, width=None, generations=None):
+        """
+        Step the forest at 1 / timestep cycles per second and show it shrunk to the panel.
+
+        :param display_fps: Screen refreshes per second, None to refresh after every cycle.
+        :param generations: Cycles to run, None for forever.
+        """
+        height = height or PANEL_HEIGHT
+        width = width or PANEL_WIDTH
+        display = DeltaDisplay(getMatrix(), self.palette)
+        frame = np.empty((height, width), dtype=np.uint8)
+        started = time.perf_counter()
+
+        def render():
+            self.downsample(height, width, out=frame)
+            display.show(frame)
+            if not runningOnPi:
+                rate = self.generation / (time.perf_counter() - started)
+                print(f"\rgeneration {self.generation}  {rate:.1f} gen/s  burning {self.stats[TreeState.BURNING]}", end='')
+
+        scheduler = FrameScheduler(sim_rate=1 / self.timestep if self.timestep > 0 else None, display_fps=display_fps)
+        try:
+            scheduler.run(self.cycle, render, steps=generations)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the workers and free the shared grids"""
+        if self.processes:
+            self.control[0] = -1
+            try:
+                self.syncBarrier.wait(timeout=5)
+            except Exception:
+                pass
+            for process in self.processes:
+                process.join(timeout=5)
+            self.processes = []
+        if self.shm is not None:
+            self.grids = self.stripCounts = self.control = self.downsampleRanks = None
+            self.local = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+# Main function
+if __name__ == "__main__":
+    TiledForest(DEFAULT_PROBABILITIES, width=8192, height=8192, density=0.00025, timestep=0).run(display_fps=10)